@@ -1,3 +1,4 @@
+import time
 import numpy as np
 import torch
 import torch.nn as nn
@@ -71,20 +72,22 @@ class GestureClassifier:
                 return gesture
         return None
 
-    def classify_all(self, result, width, height):
+    def classify_all(self, result, width, height, stamps=None):
         """
         Classify gestures for all detected hands.
 
         Returns dict: {"Left": gesture_or_None, "Right": gesture_or_None}
+        stamps: latency trace of the frame behind result; gets its "gesture" time.
         """
         gestures = {"Left": None, "Right": None}
-        if not result or not result.hand_landmarks:
-            return gestures
-        for i, handedness in enumerate(result.handedness):
-            hand_name = handedness[0].category_name
-            gestures[hand_name] = self.classify(
-                result.hand_landmarks[i], width, height
-            )
+        if result and result.hand_landmarks:
+            for i, handedness in enumerate(result.handedness):
+                hand_name = handedness[0].category_name
+                gestures[hand_name] = self.classify(
+                    result.hand_landmarks[i], width, height
+                )
+        if stamps is not None:
+            stamps["gesture"] = time.perf_counter()
         return gestures
 
     @staticmethod
@@ -1,6 +1,7 @@
 import cv2
 import mediapipe as mp
 import time
+import threading
 
 LANDMARKS = [4, 8, 12]
 
@@ -11,6 +12,10 @@ UNMERGE_DIST = 80
 class HandTracker:
     def __init__(self, model_path='models/hand_landmarker.task'):
         self.latest_result = None
+        # (result, perf_counter stage times of its frame), for latency tracing (playback/latency.py)
+        self._latest_traced = (None, None)
+        self._stamps = {}  # MediaPipe timestamp -> stamps of frames still being detected
+        self._stamps_lock = threading.Lock()
 
         base_options = mp.tasks.BaseOptions(model_asset_path=model_path)
         options = mp.tasks.vision.HandLandmarkerOptions(
@@ -28,15 +33,32 @@ class HandTracker:
         self.state = {"Left": 0, "Right": 0}
 
     def _result_callback(self, result, output_image, timestamp_ms):
+        landmarks = time.perf_counter()
+        with self._stamps_lock:
+            stamps = self._stamps.pop(timestamp_ms, None)
+            # Frames MediaPipe skipped while busy never get a result
+            for ts in [ts for ts in self._stamps if ts < timestamp_ms]:
+                del self._stamps[ts]
+        if stamps is not None:
+            stamps["landmarks"] = landmarks
+        self._latest_traced = (result, stamps)
         self.latest_result = result
 
     def get_latest_result(self):
         return self.latest_result
 
-    def detect_async(self, frame):
+    def get_latest_traced(self):
+        """(latest result, stage times of the frame it came from, or None), consistent with each other."""
+        return self._latest_traced
+
+    def detect_async(self, frame, captured=None):
+        """captured: perf_counter time the frame was read from the camera, for latency tracing."""
         now = time.time() * 1000
         timestamp = int(now - self.start_time)
 
+        detect = time.perf_counter()
+        with self._stamps_lock:
+            self._stamps[timestamp] = {"capture": captured if captured is not None else detect, "detect": detect}
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=frame)
         self.landmarker.detect_async(mp_image, timestamp)
 
@@ -1,29 +1,67 @@
-import cv2
 import os
+import time
 import curses
-from hand_tracking.tracker import HandTracker, draw_hand_skeleton
-from hand_tracking.classifier import GestureClassifier
-from playback.selector import SongSelector
-from playback.ui import PlayButton, StemButton, StartButton, MemoryCueButton, ResetCueButton, TempoResetButton, Deck, Waveform, BPMSlider, VolumeSlider
+from playback.selector import SongSelector, QUANTIZE
+from playback.engine import RemoteSongSelector
+from playback.library import Library
+from playback.latency import LatencyTracer
 
 # Fixed display size: UI and hit-testing are always in this resolution,
 # so layout looks the same on every device regardless of camera or window size.
 DISPLAY_W = 1280
 DISPLAY_H = 720
 
-
-def pick_song(stdscr, songs, deck_name, default):
+# Keys that load the next library song onto a deck in the background
+SWAP_KEYS = {ord("["): "left", ord("]"): "right"}
+KEYLOCK_KEY = ord("k")  # toggle pitch-preserving tempo changes on both decks
+# Run the audio callback in its own process (playback/engine.py) so camera,
+# model inference and drawing can't starve it of the GIL
+ENGINE_PROCESS = True
+RECORD_KEY = ord("r")  # start/stop recording the master output
+RECORDINGS_DIR = "recordings"
+STATS_KEY = ord("i")  # show/hide the audio callback stats overlay
+LATENCY_KEY = ord("l")  # print gesture-to-sound latency percentiles (also printed on exit)
+QUANTIZE_KEY = ord("b")  # cycle play/pause/cue/stem mutes between now, next beat and next bar
+
+
+def toggle_recording(selector):
+    if selector.get_recording_stats()["recording"]:
+        stats = selector.stop_recording()
+        print(f"Recorded {stats['seconds']:.1f}s to {stats['path']} "
+              f"(session {stats['started']:.1f}s-{stats['stopped']:.1f}s, {stats['overflows']} overflows)")
+    else:
+        os.makedirs(RECORDINGS_DIR, exist_ok=True)
+        path = os.path.join(RECORDINGS_DIR, time.strftime("set-%Y%m%d-%H%M%S.flac"))
+        selector.start_recording(path)
+        print(f"Recording to {path} at session time {selector.get_session_time():.1f}s")
+
+
+def song_label(entry):
+    name, duration, bpm, stems = entry
+    minutes, seconds = divmod(int(duration), 60)
+    bpm_text = f"{bpm:6.1f} BPM" if bpm else "   ?   BPM"
+    return f"{name:<40.40} {minutes:3d}:{seconds:02d}  {bpm_text}  {len(stems)} stems"
+
+
+def next_song(songs, current):
+    if current not in songs:
+        return songs[0]
+    return songs[(songs.index(current) + 1) % len(songs)]
+
+
+def pick_song(stdscr, songs, deck_name, default, labels=None):
+    labels = labels or songs
     curses.curs_set(0)
     idx = songs.index(default) if default in songs else 0
 
     while True:
         stdscr.clear()
         stdscr.addstr(0, 0, f"Select song for {deck_name} deck  (↑↓ to scroll, Enter to confirm)\n\n")
-        for i, song in enumerate(songs):
+        for i, label in enumerate(labels):
             if i == idx:
-                stdscr.addstr(f"  > {song}\n", curses.A_REVERSE)
+                stdscr.addstr(f"  > {label}\n", curses.A_REVERSE)
             else:
-                stdscr.addstr(f"    {song}\n")
+                stdscr.addstr(f"    {label}\n")
         stdscr.refresh()
 
         key = stdscr.getch()
@@ -35,19 +73,30 @@ def pick_song(stdscr, songs, deck_name, default):
             return songs[idx]
 
 
-def select_songs():
-    songs = sorted(s for s in os.listdir("songs") if not s.startswith("."))
+def select_songs(library):
+    # Only new or changed songs are decoded; the rest come straight from the index
+    library.update()
+    entries = library.songs()
+    songs = [entry[0] for entry in entries]
+    labels = [song_label(entry) for entry in entries]
     def_left  = songs[0]
     def_right = songs[1] if len(songs) > 1 else songs[0]
 
     def run(stdscr):
-        left  = pick_song(stdscr, songs, "LEFT",  def_left)
-        right = pick_song(stdscr, songs, "RIGHT", def_right)
+        left  = pick_song(stdscr, songs, "LEFT",  def_left, labels)
+        right = pick_song(stdscr, songs, "RIGHT", def_right, labels)
         return left, right
 
     return curses.wrapper(run)
 
 def main():
+    # Imported here, not at the top: the engine process is spawned and re-imports
+    # this module, and must not load OpenCV, MediaPipe or torch
+    import cv2
+    from hand_tracking.tracker import HandTracker, draw_hand_skeleton
+    from hand_tracking.classifier import GestureClassifier
+    from playback.ui import PlayButton, StemButton, StartButton, MemoryCueButton, ResetCueButton, TempoResetButton, Deck, Waveform, BPMSlider, VolumeSlider, LevelMeter, Spectrum, AudioStatsOverlay
+
     tracker = HandTracker()
     cap = cv2.VideoCapture(0)
 
@@ -67,15 +116,19 @@ def main():
     cv2.namedWindow('CV DJ Set', cv2.WINDOW_NORMAL)
     cv2.resizeWindow('CV DJ Set', width, height)
 
-    def_left, def_right = select_songs()
+    library = Library()
+    def_left, def_right = select_songs(library)
+    songs = [entry[0] for entry in library.songs()]
     print(f"Left: {def_left}  |  Right: {def_right}")
 
-    song_selector = SongSelector()
+    selector_class = RemoteSongSelector if ENGINE_PROCESS else SongSelector
+    song_selector = selector_class(library=library)
     song_selector.select("left", def_left)
     song_selector.select("right", def_right)
     song_selector.apply_bpm_sync()
 
     gesture_classifier = GestureClassifier()
+    tracer = LatencyTracer(song_selector)
 
     # Play buttons (display coords: left on left, right on right)
     # Tweak: Push the bottom layout down slightly to distance it from the waveforms
@@ -136,6 +189,14 @@ def main():
     right_wf = Waveform(right_deck.cx - deck_radius, wf_y, 2 * deck_radius, wf_height, selector=song_selector, side="right")
     waveforms = [left_wf, right_wf]
 
+    # Output spectrum and meters (left deck, master, right deck) between the decks
+    spectrum = Spectrum(width // 2 - 200, 20, 400, 90, selector=song_selector)
+    meter_w, meter_h = 16, 140
+    meters = [LevelMeter(width // 2 + dx - meter_w // 2, 125, meter_w, meter_h, song_selector, side)
+              for dx, side in ((-40, "left"), (0, None), (40, "right"))]
+    stats_overlay = AudioStatsOverlay(width // 2 - 165, height - 90, song_selector)
+    show_stats = False
+
     slider_w = 2 * stem_size + gap
     slider_h = 44
     slider_y_left  = ly + 2 * (stem_size + gap) + 10
@@ -154,20 +215,23 @@ def main():
     try:
         while True:
             ret, frame = cap.read()
+            captured = time.perf_counter()
             if not ret:
                 print("Ignoring empty camera frame.")
                 continue
 
             frame = cv2.resize(frame, (DISPLAY_W, DISPLAY_H))
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            tracker.detect_async(rgb_frame)
+            tracker.detect_async(rgb_frame, captured)
 
-            result = tracker.get_latest_result()
+            result, stamps = tracker.get_latest_traced()
+            # Commands from gestures and widgets below are traced back to the frame behind result
+            event = tracer.begin(stamps)
 
             frame = draw_hand_skeleton(frame, tracker, result)
 
             # Gesture inference — both hands
-            gestures = gesture_classifier.classify_all(result, width, height)
+            gestures = gesture_classifier.classify_all(result, width, height, event)
 
             # Process gestures for each hand
             for hand in ["Left", "Right"]:
@@ -209,6 +273,7 @@ def main():
                 for slider in sliders:
                     if tracker.state[hand] == 1:
                         slider.update(hand, pinch_pos)
+            tracer.end(event)
 
             reversed_frame = cv2.flip(frame, 1)
 
@@ -226,12 +291,41 @@ def main():
             for slider in sliders:
                 slider.draw(reversed_frame)
 
+            spectrum.draw(reversed_frame)
+            for meter in meters:
+                meter.draw(reversed_frame)
+            if show_stats:
+                stats_overlay.draw(reversed_frame)
+
             cv2.imshow('CV DJ Set', reversed_frame)
 
-            if cv2.waitKey(1) == ord('q'):
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
                 break
+            if key == STATS_KEY:
+                show_stats = not show_stats
+            if key == LATENCY_KEY:
+                print(tracer.report())
+            if key == QUANTIZE_KEY:
+                modes = list(QUANTIZE)
+                song_selector.quantize = modes[(modes.index(song_selector.quantize) + 1) % len(modes)]
+                print(f"Quantize: {song_selector.quantize}")
+            if key == RECORD_KEY:
+                toggle_recording(song_selector)
+            if key == KEYLOCK_KEY:
+                on = not song_selector.keylock["left"]
+                for side in song_selector.decks:
+                    song_selector.set_keylock(side, on)
+            if key in SWAP_KEYS:
+                side = SWAP_KEYS[key]
+                loading = song_selector.loading(side)
+                current = loading[0] if loading else song_selector.tracks[side].song
+                song_selector.queue(side, next_song(songs, current))
     finally:
+        if tracer.snapshot()["events"]:
+            print(tracer.report())
         song_selector.close()
+        library.close()
         tracker.close()
         cap.release()
         cv2.destroyAllWindows()
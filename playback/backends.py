@@ -0,0 +1,127 @@
+"""
+Output backends: where the audio callback's blocks go.
+
+"sounddevice" is the sound card, through a PortAudio OutputStream. It is
+imported only when opened, so a machine without PortAudio can still
+construct and drive the engine. "null" and "file" need no audio hardware:
+a driver thread calls the callback block after block on a simulated
+clock, paced to real time (or any multiple of it), and throws the output
+away or writes it to a sound file. With speed=0 there is no thread and
+step() advances the clock by hand, for deterministic tests and benchmarks.
+
+Every backend looks like the part of sd.OutputStream that SongSelector
+uses: start(), stop(), close(), active, samplerate, blocksize, latency.
+"""
+import time
+import threading
+import numpy as np
+import soundfile as sf
+
+
+class StreamTime:
+    """The callback's time argument, in simulated seconds (as sounddevice's, minus input)."""
+
+    def __init__(self):
+        self.currentTime = 0.0
+        self.outputBufferDacTime = 0.0
+
+
+class NullStream:
+    """Calls callback(outdata, frames, time, status) on a simulated clock and discards the output."""
+
+    def __init__(self, sr, callback, blocksize=512, speed=1.0, channels=2):
+        """speed: simulated seconds per wall-clock second for the driver thread; 0 = no thread, use step()."""
+        self.samplerate = sr
+        self.callback = callback
+        self.blocksize = blocksize
+        self.speed = speed
+        self.latency = blocksize / sr
+        self.frames = 0  # simulated clock
+        self._running = False
+        self._out = np.zeros((blocksize, channels), dtype=np.float32)
+        self._time = StreamTime()
+        self._thread = None
+
+    def step(self, blocks=1):
+        """Run the callback for blocks more blocks. Returns the last output block."""
+        for _ in range(blocks):
+            out = self._out
+            out.fill(0.0)
+            self._time.currentTime = self.frames / self.samplerate
+            self._time.outputBufferDacTime = self._time.currentTime + self.latency
+            self.callback(out, self.blocksize, self._time, None)
+            self._emit(out)
+            self.frames += self.blocksize
+        return self._out
+
+    def _emit(self, out):
+        pass
+
+    @property
+    def active(self):
+        """True while the driver thread calls back. A stepped stream never is: nothing comes until step()."""
+        return self._thread is not None
+
+    def start(self):
+        self._running = True
+        if self.speed and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="null-stream", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        block_seconds = self.blocksize / self.samplerate / self.speed
+        due = time.perf_counter()
+        while self._running:
+            self.step()
+            due += block_seconds
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                due = time.perf_counter()  # fell behind: like a real device, don't try to catch up
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+
+class FileStream(NullStream):
+    """NullStream that writes every block to a sound file (format from the extension)."""
+
+    def __init__(self, sr, callback, path, blocksize=512, speed=1.0, channels=2, subtype=None):
+        super().__init__(sr, callback, blocksize, speed, channels)
+        self._file = sf.SoundFile(path, "w", samplerate=sr, channels=channels, subtype=subtype)
+
+    def _emit(self, out):
+        self._file.write(out)
+
+    def close(self):
+        super().close()
+        if not self._file.closed:
+            self._file.close()
+
+
+def _sounddevice(sr, callback, **options):
+    import sounddevice as sd
+    return sd.OutputStream(samplerate=sr, channels=2, dtype="float32", callback=callback, **options)
+
+
+BACKENDS = {"sounddevice": _sounddevice, "null": NullStream, "file": FileStream}
+
+
+def open_stream(backend, sr, callback, **options):
+    """Started output stream. backend: a BACKENDS name or a factory(sr, callback, **options)."""
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown audio backend {backend!r}; expected one of {sorted(BACKENDS)}")
+        factory = BACKENDS[backend]
+    else:
+        factory = backend
+    stream = factory(sr, callback, **options)
+    stream.start()
+    return stream
@@ -0,0 +1,141 @@
+"""
+On-disk cache of decoded stems.
+
+Each entry is the raw PCM (float32, or a compact storage dtype) of one
+song's stems at the engine sample rate, stored as a single (n_stems, frames, channels) block, plus a small
+JSON sidecar describing it. Entries are keyed by every source file's
+absolute path, mtime and size, the target rate and an optional variant tag
+(e.g. a pre-rendered tempo sync), so editing or replacing any stem simply
+misses the cache. Hits are opened with np.memmap: loading is
+near-instant, nothing is copied, and the OS page cache decides what stays
+resident.
+"""
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+CACHE_DIR = os.path.join(".cache", "pcm")
+
+
+def _key(paths, sr, variant, dtype):
+    ident = [str(sr), variant, np.dtype(dtype).name]
+    for path in paths:
+        st = os.stat(path)
+        ident.append(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}")
+    return hashlib.sha1("\n".join(ident).encode()).hexdigest()[:24]
+
+
+def _entry(key):
+    base = os.path.join(CACHE_DIR, key)
+    return base + ".pcm", base + ".json"
+
+
+def load(paths, sr, variant="", dtype=np.float32):
+    """Return a read-only memmap of the stems in paths decoded at sr, or None on a miss."""
+    dtype = np.dtype(dtype)
+    try:
+        pcm, meta = _entry(_key(paths, sr, variant, dtype))
+        with open(meta) as f:
+            info = json.load(f)
+        shape = tuple(info["shape"])
+        if os.path.getsize(pcm) != int(np.prod(shape)) * dtype.itemsize:
+            return None  # torn or foreign file
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(pcm, dtype=dtype, mode="r", shape=shape)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store(paths, sr, data, variant=""):
+    """Write the decoded block for paths. Written to a temp file and renamed, so readers never see half an entry."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    pcm, meta = _entry(_key(paths, sr, variant, data.dtype))
+    data = np.ascontiguousarray(data)
+    # Per thread as well as per process: two decks can finish decoding the same song at once
+    tmp = f"{pcm}.{os.getpid()}.{threading.get_ident()}.tmp"
+    data.tofile(tmp)
+    os.replace(tmp, pcm)
+    sources = []
+    for path in paths:
+        st = os.stat(path)
+        sources.append({"path": os.path.abspath(path), "mtime_ns": st.st_mtime_ns, "size": st.st_size})
+    info = {
+        "sources": sources,
+        "sr": sr,
+        "variant": variant,
+        "dtype": data.dtype.name,
+        "shape": list(data.shape),
+    }
+    with open(tmp, "w") as f:
+        json.dump(info, f)
+    os.replace(tmp, meta)
+
+
+def entries():
+    """Yield (key, info) for every complete entry."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for name in sorted(os.listdir(CACHE_DIR)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(CACHE_DIR, name)) as f:
+                yield name[:-5], json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def _remove(key):
+    for p in _entry(key):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def _is_stale(info):
+    for src in info.get("sources", []):
+        try:
+            st = os.stat(src["path"])
+        except OSError:
+            return True
+        if st.st_mtime_ns != src["mtime_ns"] or st.st_size != src["size"]:
+            return True
+    return False
+
+
+def _song(info):
+    sources = info.get("sources") or [{"path": ""}]
+    return os.path.basename(os.path.dirname(sources[0]["path"]))
+
+
+def invalidate(songs=None, stale_only=False):
+    """Delete entries. songs limits it to those song folders; stale_only keeps entries whose source is unchanged.
+
+    Returns the number of entries removed.
+    """
+    removed = 0
+    for key, info in list(entries()):
+        if songs is not None and _song(info) not in songs:
+            continue
+        if stale_only and not _is_stale(info):
+            continue
+        _remove(key)
+        removed += 1
+    return removed
+
+
+def usage():
+    """(entry count, bytes on disk)."""
+    count, size = 0, 0
+    for key, _ in entries():
+        for p in _entry(key):
+            try:
+                size += os.path.getsize(p)
+            except OSError:
+                pass
+        count += 1
+    return count, size
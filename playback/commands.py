@@ -0,0 +1,150 @@
+"""
+Control plane between the UI/render thread and the audio callback.
+
+The UI never writes audio state directly. Scalar commands (play, rate, seek...)
+go through a preallocated single-producer/single-consumer ring, and whole
+objects (new stem sets) are handed over through a one-slot Mailbox. The audio
+callback drains both once at the top of every block, so it never sees a deck
+half-updated and never takes a lock.
+
+Both structures rely on CPython making single attribute/list-item stores
+atomic: the producer fills a slot before it publishes the new tail index,
+and the consumer only reads slots behind that index.
+"""
+
+# Opcodes. Kept as small ints so a slot is just four preallocated list entries.
+PLAY = 1
+PAUSE = 2
+SET_RATE = 3         # value = playback rate
+SET_STEM_VOLUME = 4  # arg = stem index, value = gain
+SET_DECK_VOLUME = 5  # value = gain
+SEEK = 6             # value = relative offset in samples
+SET_POSITION = 7     # value = absolute position in samples
+SET_SYNC = 8         # value = BPM-sync tempo ratio (bpm / target bpm)
+SET_LOOP = 9         # arg = loop start sample, value = loop length in samples
+LOOP_ROLL = 10       # as SET_LOOP, but leaving it resumes where playback would have been
+EXIT_LOOP = 11
+SET_CROSSFADER = 12        # deck unused, value = fader position 0 (side A) .. 1 (side B)
+SET_CROSSFADER_CURVE = 13  # deck unused, arg = index into graph.CURVES
+SET_FILTER = 14            # arg = 0 high-pass / 1 low-pass, value = corner in Hz (0 = off)
+SET_KEYLOCK = 15           # value = 1 to change tempo without changing pitch
+SET_INTERPOLATION = 16     # deck unused, arg = index into mixer.INTERPOLATION
+MARK = 17                  # deck unused, arg = latency trace id: the commands before it have been applied
+QUANTIZE = 18              # arg = 1 next beat / 2 next bar: the deck's next command waits for it
+
+# Commands where only the latest value per (op, deck, arg) matters; arg must be below MAX_ARGS. When several
+# land in the same block the earlier ones are counted as coalesced.
+COALESCING = frozenset({SET_RATE, SET_STEM_VOLUME, SET_DECK_VOLUME, SET_POSITION, SET_SYNC,
+                        SET_CROSSFADER, SET_CROSSFADER_CURVE, SET_FILTER, SET_INTERPOLATION})
+
+MAX_OPS = 32
+MAX_DECKS = 8
+MAX_ARGS = 8
+
+
+class CommandRing:
+    """Fixed-size SPSC queue of (op, deck, arg, value) commands.
+
+    push() is called from the UI thread only, drain() from the audio callback
+    only. All slots are allocated up front; a full ring drops the new command
+    and counts it instead of blocking or growing.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._op = [0] * capacity
+        self._deck = [0] * capacity
+        self._arg = [0] * capacity
+        self._value = [0.0] * capacity
+        self._head = 0  # next slot to read; written by the consumer only
+        self._tail = 0  # next slot to write; written by the producer only
+
+        # Last drain in which each (op, deck, arg) key was seen, for coalescing stats
+        self._seen = [0] * (MAX_OPS * MAX_DECKS * MAX_ARGS)
+        self._drains = 0
+
+        self.pushed = 0
+        self.applied = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def push(self, op, deck, value=0.0, arg=0):
+        """Queue a command. Returns False (and counts a drop) if the ring is full."""
+        tail = self._tail
+        nxt = (tail + 1) % self.capacity
+        if nxt == self._head:
+            self.dropped += 1
+            return False
+        self._op[tail] = op
+        self._deck[tail] = deck
+        self._arg[tail] = arg
+        self._value[tail] = float(value)
+        self._tail = nxt  # publish only after the slot is complete
+        self.pushed += 1
+        return True
+
+    def drain(self, handler):
+        """Call handler(op, deck, arg, value) for every queued command, in order."""
+        head = self._head
+        tail = self._tail
+        if head == tail:
+            return 0
+        self._drains += 1
+        drain_id = self._drains
+        n = 0
+        while head != tail:
+            op = self._op[head]
+            deck = self._deck[head]
+            arg = self._arg[head]
+            if op in COALESCING:
+                key = (op * MAX_DECKS + deck) * MAX_ARGS + arg
+                if self._seen[key] == drain_id:
+                    self.coalesced += 1
+                self._seen[key] = drain_id
+            handler(op, deck, arg, self._value[head])
+            head = (head + 1) % self.capacity
+            n += 1
+        self._head = head
+        self.applied += n
+        return n
+
+    def __len__(self):
+        return (self._tail - self._head) % self.capacity
+
+    def stats(self):
+        return {
+            "pushed": self.pushed,
+            "applied": self.applied,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "pending": len(self),
+        }
+
+
+class Mailbox:
+    """Latest-value slot: any thread posts, the audio callback takes.
+
+    Used for objects too big for the ring (e.g. a freshly loaded stem set).
+    Posting again before the consumer takes replaces the old value; those
+    skipped values are counted as coalesced.
+    """
+
+    def __init__(self):
+        self._value = None
+        self._posted = 0
+        self._taken = 0
+        self.coalesced = 0
+
+    def post(self, value):
+        self._value = value
+        self._posted += 1  # publish after the value is in place
+
+    def take(self):
+        """Return the newest posted value, or None if nothing new since the last take."""
+        posted = self._posted
+        if posted == self._taken:
+            return None
+        value = self._value
+        self.coalesced += posted - self._taken - 1
+        self._taken = posted
+        return value
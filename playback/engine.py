@@ -0,0 +1,279 @@
+"""
+The audio engine in its own process, so the callback never waits for the UI's GIL.
+
+RemoteSongSelector is a SongSelector whose audio runs elsewhere. Every
+control method still updates the UI-side state here, but the command it
+queues goes down a pipe to an engine process. That process runs an
+ordinary SongSelector with the sound card open and a receiver thread as
+the only producer for its command ring.
+
+Stems never cross the pipe: the UI process decodes into shared memory
+(playback/shared.py) and sends a descriptor, which the engine maps.
+
+What the UI reads every frame is written by the engine after every audio
+block into a shared state segment: playheads, track ends, levels, the
+session clock, plus the spectrum a few times a second. Reading it costs
+no round trip. Rarer requests (recording, command, callback, submix and
+schedule stats, latency marks) are synchronous calls over the pipe.
+"""
+import time
+import threading
+import multiprocessing
+import numpy as np
+from playback import commands as cmd, meters, shared, submix
+from playback.selector import SongSelector, DECKS
+from playback.shared import SharedTrack
+from playback.tracks import TrackCache
+
+# Pipe messages: tuples starting with one of these
+COMMAND = 1  # (COMMAND, op, deck, value, arg): push onto the engine's command ring
+TRACK = 2    # (TRACK, deck, descriptor, position scale, sync ratio, stop, beat grid): swap a deck's stems
+CALL = 3     # (CALL, method name, args): run a selector method, reply (ok, result or exception)
+CLOSE = 4
+
+START_TIMEOUT = 10.0  # seconds to wait for the engine process to open the sound card
+
+
+def _state_layout(n_decks):
+    """(name, shape, dtype) of each array in the shared state segment, in order."""
+    return (
+        ("position", (n_decks,), np.float64),
+        ("ends", (n_decks,), np.int64),  # times each deck stopped at the end of its song
+        ("clock", (1,), np.int64),  # session clock, frames
+        ("levels", (n_decks + 1, 2), np.float32),  # as meters.Meters.levels()
+        ("spectrum", (meters.BANDS,), np.float32),
+        ("ready", (1,), np.int64),  # set once the engine's stream is running
+    )
+
+
+def _state_size(n_decks):
+    return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in _state_layout(n_decks))
+
+
+def _state_arrays(mm, n_decks):
+    arrays = {}
+    offset = 0
+    for name, shape, dtype in _state_layout(n_decks):
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=mm, offset=offset)
+        offset += arrays[name].nbytes
+    return arrays
+
+
+class _Engine(SongSelector):
+    """The SongSelector in the engine process: publishes its state after every block."""
+
+    def __init__(self, state, **kwargs):
+        self._state_position = state["position"]
+        self._state_ends = state["ends"]
+        self._state_clock = state["clock"]
+        self._state_levels = state["levels"]
+        super().__init__(**kwargs)
+
+    def _callback(self, outdata, frames, time, status):
+        super()._callback(outdata, frames, time, status)
+        self._state_position[:] = self._position
+        self._state_clock[0] = self._clock
+        self.meters.level_ring.latest(self._state_levels)
+
+    def _stop_at_end(self, deck):
+        super()._stop_at_end(deck)
+        self._state_ends[deck] += 1
+
+
+def serve(conn, state_name, sr, storage, decks, interpolation, backend, backend_options, submix_budget):
+    """Engine process main loop: play on the output backend, driven by messages on conn."""
+    _, mm = shared.attach(state_name)
+    state = _state_arrays(mm, len(decks))
+    engine = _Engine(state, sr=sr, storage=storage, decks=decks, interpolation=interpolation,
+                     backend=backend, backend_options=backend_options, submix_budget=submix_budget)
+    state["ready"][0] = 1
+    current = [None] * len(decks)  # (key, track) each deck was last sent, so a song on two decks is mapped once
+    last = time.perf_counter()
+    try:
+        while True:
+            if conn.poll(meters.INTERVAL):
+                msg = conn.recv()
+                kind = msg[0]
+                if kind == COMMAND:
+                    engine.commands.push(*msg[1:])
+                elif kind == TRACK:
+                    _, deck, desc, scale, ratio, stop, grid = msg
+                    key = desc["data"] or desc["file"]
+                    attached = {k: t for k, t in filter(None, current)}
+                    track = attached.get(key)
+                    if track is None:
+                        try:
+                            track = SharedTrack.attach(desc)
+                        except FileNotFoundError:
+                            continue  # the UI already let go of it; a newer track is on its way
+                    current[deck] = (key, track)
+                    engine._staged[deck].post((track, scale, ratio, stop, grid))
+                elif kind == CALL:
+                    _, name, args = msg
+                    try:
+                        reply = (True, getattr(engine, name)(*args))
+                    except Exception as e:
+                        reply = (False, e)
+                    conn.send(reply)
+                elif kind == CLOSE:
+                    break
+            now = time.perf_counter()
+            if now - last >= meters.INTERVAL:
+                state["spectrum"][:] = engine.get_spectrum()
+                last = now
+    except EOFError:
+        pass  # the UI process is gone
+    finally:
+        engine.close()
+
+
+class _DeckValues:
+    """Per-deck view of a shared array, indexed by side like the dict SongSelector keeps."""
+
+    def __init__(self, decks, values):
+        self._index = {side: i for i, side in enumerate(decks)}
+        self._values = values
+
+    def __getitem__(self, side):
+        return float(self._values[self._index[side]])
+
+    def __setitem__(self, side, value):
+        self._values[self._index[side]] = value
+
+
+class _Playing(dict):
+    """The UI's playing flags, cleared when the engine reports a deck reaching the end of its song."""
+
+    def __init__(self, decks, ends):
+        super().__init__((side, False) for side in decks)
+        self._index = {side: i for i, side in enumerate(decks)}
+        self._ends = ends
+        self._seen = [0] * len(decks)
+
+    def __getitem__(self, side):
+        i = self._index[side]
+        ends = int(self._ends[i])
+        if ends != self._seen[i]:
+            self._seen[i] = ends
+            dict.__setitem__(self, side, False)
+        return dict.__getitem__(self, side)
+
+
+class _RemoteMailbox:
+    """Stands in for a deck's Mailbox: posting a track sends it to the engine."""
+
+    def __init__(self, selector, deck):
+        self._selector = selector
+        self._deck = deck
+        self.coalesced = 0
+
+    def post(self, value):
+        track, scale, ratio, stop, grid = value
+        self._selector._send((TRACK, self._deck, shared.describe(track), scale, ratio, stop, grid))
+
+
+class RemoteSongSelector(SongSelector):
+    """SongSelector with the audio callback in a separate engine process.
+
+    Same interface; songs are decoded into shared memory. position, playing,
+    levels, the spectrum and the session clock come from the engine.
+    """
+
+    def __init__(self, sr=44100, storage="float32", decks=DECKS, library=None, track_cache=None,
+                 interpolation="linear", backend="sounddevice", backend_options=None,
+                 submix_budget=submix.DEFAULT_BUDGET):
+        """As SongSelector; backend, backend_options and submix_budget apply in the engine process
+        (a backend factory must be picklable)."""
+        decks = tuple(decks)
+        n = len(decks)
+        self._state_segment, mm = shared.create(_state_size(n))
+        self._state = _state_arrays(mm, n)
+        self._send_lock = threading.Lock()
+        ctx = multiprocessing.get_context("spawn")  # a fresh interpreter: no camera, model or UI state
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(target=serve, name="audio-engine", daemon=True,
+                                    args=(child, self._state_segment.name, sr, storage, decks, interpolation,
+                                          backend, backend_options, submix_budget))
+        self._process.start()
+        child.close()
+        deadline = time.monotonic() + START_TIMEOUT
+        while not self._state["ready"][0]:
+            if not self._process.is_alive() or time.monotonic() > deadline:
+                self._state_segment.unlink()
+                raise RuntimeError("Audio engine process failed to start")
+            time.sleep(0.01)
+
+        track_cache = track_cache if track_cache is not None else TrackCache(track_class=SharedTrack)
+        super().__init__(sr, storage, stream=False, decks=decks, library=library, track_cache=track_cache,
+                         interpolation=interpolation)
+        self._staged = [_RemoteMailbox(self, deck) for deck in range(n)]
+        self.position = _DeckValues(decks, self._state["position"])
+        self.playing = _Playing(decks, self._state["ends"])
+
+    def _send(self, msg):
+        with self._send_lock:
+            self._conn.send(msg)
+
+    def _push(self, op, side, value=0.0, arg=0):
+        self._traced()
+        self._send((COMMAND, op, self._index[side], float(value), arg))
+
+    def mark(self, trace_id):
+        self._send((COMMAND, cmd.MARK, 0, 0.0, trace_id))
+
+    def _call(self, name, *args):
+        with self._send_lock:
+            self._conn.send((CALL, name, args))
+            ok, result = self._conn.recv()
+        if not ok:
+            raise result
+        return result
+
+    def get_levels(self, side=None):
+        row = self._state["levels"][len(self.decks) if side is None else self._index[side]]
+        return float(row[0]), float(row[1])
+
+    def get_spectrum(self):
+        return self._state["spectrum"].copy()
+
+    def get_session_time(self):
+        return int(self._state["clock"][0]) / self.sr
+
+    def start_recording(self, path, subtype=None):
+        self._call("start_recording", path, subtype)
+
+    def stop_recording(self):
+        return self._call("stop_recording")
+
+    def get_recording_stats(self):
+        return self._call("get_recording_stats")
+
+    def get_command_stats(self):
+        return self._call("get_command_stats")
+
+    def get_audio_stats(self):
+        return self._call("get_audio_stats")
+
+    def get_submix_stats(self):
+        return self._call("get_submix_stats")
+
+    def take_schedule_log(self):
+        return self._call("take_schedule_log")
+
+    def get_schedule_stats(self):
+        return self._call("get_schedule_stats")
+
+    def take_latency_marks(self):
+        return self._call("take_latency_marks")
+
+    def close(self):
+        try:
+            self._send((CLOSE,))
+        except (OSError, ValueError):
+            pass  # engine already gone
+        self._process.join(START_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        super().close()
+        self._state_segment.unlink()
@@ -0,0 +1,185 @@
+"""
+Per-block mixer graph, run by the audio callback after each deck's stems are mixed:
+
+  deck -> high-pass -> low-pass -> gain ramp (deck volume x crossfader) -> sum
+       -> master gain -> limiter -> clip
+
+Gains move over a short linear ramp instead of jumping, so volume and
+crossfader moves never click. Filters are RBJ biquads run as second-order
+sections with their state carried from block to block; a deck with both
+filters open skips them entirely. The limiter follows the block peak with
+instant-per-block attack and an exponential release, and the final clip
+only catches what a ramp lets through. Buffers are preallocated and sized
+for the largest block seen.
+"""
+import math
+import numpy as np
+from scipy.signal import sosfilt
+
+CURVES = ("cut", "linear", "constant_power")  # index = command arg
+CUT_SLOPE = 16.0  # "cut": a deck is at full level until the fader is within 1/16 of the far end
+RAMP_FRAMES = 256
+MASTER_GAIN = 0.5  # headroom for two full decks
+LIMIT = 0.98
+RELEASE_SECONDS = 0.15
+FILTER_Q = 1.0 / math.sqrt(2.0)  # Butterworth
+HIGHPASS, LOWPASS = 0, 1  # filter section index = command arg
+
+# Crossfader sides
+SIDE_A, SIDE_B, THRU = 0, 1, -1
+
+
+def crossfade_gains(x, curve):
+    """(gain for side A, gain for side B) at fader position x in [0, 1] (0 = all A)."""
+    if curve == "linear":
+        return 1.0 - x, x
+    if curve == "constant_power":
+        return math.cos(x * math.pi / 2), math.sin(x * math.pi / 2)
+    return min(1.0, (1.0 - x) * CUT_SLOPE), min(1.0, x * CUT_SLOPE)
+
+
+def default_assign(side):
+    """Crossfader side for a deck name: left decks on A, right decks on B, others through."""
+    if side.startswith("left"):
+        return SIDE_A
+    if side.startswith("right"):
+        return SIDE_B
+    return THRU
+
+
+def _biquad(kind, cutoff, sr):
+    """One normalized second-order section [b0, b1, b2, 1, a1, a2] (RBJ cookbook)."""
+    w0 = 2 * math.pi * cutoff / sr
+    cos_w0 = math.cos(w0)
+    alpha = math.sin(w0) / (2 * FILTER_Q)
+    a0 = 1 + alpha
+    if kind == LOWPASS:
+        b = ((1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2)
+    else:
+        b = ((1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2)
+    return (b[0] / a0, b[1] / a0, b[2] / a0, 1.0, -2 * cos_w0 / a0, (1 - alpha) / a0)
+
+
+class DeckFilter:
+    """High-pass then low-pass on a stereo block, with persistent filter state."""
+
+    def __init__(self, sr, channels=2):
+        self.sr = sr
+        self.sos = np.zeros((2, 6))
+        self.sos[:, 0] = self.sos[:, 3] = 1.0  # both sections pass-through
+        self.zi = np.zeros((2, 2, channels))
+        self.cutoff = [0.0, 0.0]  # Hz per section, 0 = open
+
+    @property
+    def active(self):
+        return self.cutoff[HIGHPASS] > 0 or self.cutoff[LOWPASS] > 0
+
+    def set_cutoff(self, kind, hz):
+        """Set the high-pass or low-pass corner; 0 (or >= Nyquist for low-pass) opens it."""
+        if hz >= 0.49 * self.sr or hz < 0:
+            hz = 0.0
+        was_active = self.active
+        self.cutoff[kind] = hz
+        if hz:
+            self.sos[kind] = _biquad(kind, hz, self.sr)
+        else:
+            self.sos[kind] = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+        if not was_active:
+            self.zi.fill(0.0)  # don't resume from state left over from when the filter was last used
+
+    def process(self, block):
+        """Filter block (frames, channels) in place."""
+        y, zf = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        block[:] = y
+        self.zi[:] = zf
+
+
+class MixerGraph:
+    """Gain ramps, crossfader, filters and master limiter for n_decks decks."""
+
+    def __init__(self, sr, assign, max_frames=4096):
+        self.sr = sr
+        n = len(assign)
+        self.assign = list(assign)
+        self.filters = [DeckFilter(sr) for _ in range(n)]
+        self.gain = np.ones(n)  # gain each deck ended its last block at
+        self._target = np.ones(n)  # gain each deck is ramping to
+        self._step = np.zeros(n)  # per-frame change of that ramp, kept across blocks
+        self.crossfader = 0.5
+        self.curve = CURVES[0]
+        self.limiter_gain = 1.0
+        self._alloc(max_frames)
+
+    def _alloc(self, max_frames):
+        self.max_frames = max_frames
+        self._unit = np.arange(1, max_frames + 1, dtype=np.float64)[:, None]
+        self._ramp = np.empty((max_frames, 1), dtype=np.float32)
+        self._deck = np.empty((max_frames, 2), dtype=np.float32)
+
+    def ensure(self, frames):
+        if frames > self.max_frames:
+            self._alloc(frames)
+
+    def deck_buffer(self, frames):
+        """Zeroed (frames, 2) buffer to mix one deck's stems into."""
+        buf = self._deck[:frames]
+        buf.fill(0.0)
+        return buf
+
+    def _ramp_gain(self, block, start, end, step):
+        """Multiply block by a gain moving from start toward end by step per frame, then holding at end.
+
+        Returns the gain reached at the end of the block, so a ramp longer
+        than the block carries on in the next one.
+        """
+        frames = len(block)
+        if start == end:
+            if end != 1.0:
+                block *= end
+            return end
+        left = math.ceil((end - start) / step - 1e-6)  # frames until end; the tolerance absorbs rounding
+        n = min(frames, left)
+        ramp = self._ramp[:frames]
+        np.multiply(self._unit[:n], step, out=ramp[:n])
+        ramp[:n] += start
+        if n == left:
+            ramp[n - 1:] = end
+            reached = end
+        else:
+            reached = start + step * n
+        block *= ramp
+        return reached
+
+    def deck_gain(self, deck, volume):
+        """Target gain for a deck: its volume times its crossfader gain."""
+        side = self.assign[deck]
+        if side == THRU:
+            return volume
+        return volume * crossfade_gains(self.crossfader, self.curve)[side]
+
+    def process_deck(self, deck, block, volume):
+        """Filter and gain-ramp one deck's block in place."""
+        f = self.filters[deck]
+        if f.active:
+            f.process(block)
+        target = self.deck_gain(deck, volume)
+        if target != self._target[deck]:
+            # A new target restarts the ramp from wherever the last one got to
+            self._target[deck] = target
+            self._step[deck] = (target - self.gain[deck]) / RAMP_FRAMES
+        self.gain[deck] = self._ramp_gain(block, self.gain[deck], target, self._step[deck])
+
+    def master(self, out):
+        """Master gain, limiter and safety clip on the summed block, in place."""
+        out *= MASTER_GAIN
+        peak = max(float(out.max()), -float(out.min()))
+        target = LIMIT / peak if peak > LIMIT else 1.0
+        gain = self.limiter_gain
+        if target < gain:
+            new = target  # attack: reach the needed reduction within this block's ramp
+        else:
+            release = 1.0 - math.exp(-len(out) / (self.sr * RELEASE_SECONDS))
+            new = min(target, gain + (1.0 - gain) * release)
+        # Within the block, even a short one: an attack that waited for the next block would clip
+        self.limiter_gain = self._ramp_gain(out, gain, new, (new - gain) / min(len(out), RAMP_FRAMES))
+        np.clip(out, -1.0, 1.0, out=out)
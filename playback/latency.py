@@ -0,0 +1,103 @@
+"""
+Gesture-to-sound latency: from a camera frame to the audio it changed leaving the sound card.
+
+An event is a dict of stage -> time.perf_counter() seconds, filled in as
+one camera frame moves through the app:
+
+  capture    main loop got the frame from the camera
+  detect     frame handed to MediaPipe (HandTracker.detect_async)
+  landmarks  MediaPipe's result callback fired for it
+  gesture    GestureClassifier.classify_all finished with its landmarks
+  command    the first SongSelector command it caused was queued
+  applied    the audio callback applied that command, at the start of a block
+  audible    that block reaches the DAC: applied + the stream's output latency
+
+A frame is traced once, on the first main-loop pass that sees its
+landmarks, and only counts if it changed something. LatencyTracer tags the
+selector's command queue with an event's id (commands.MARK) after the
+frame's commands; the audio callback reports when it reached that mark
+(SongSelector.take_latency_marks()). perf_counter is a system-wide
+monotonic clock, so this works with the engine in its own process too.
+There, taking the marks is a round trip to the engine, so it happens
+every POLL_INTERVAL rather than every frame; the times come from the
+audio thread, so polling late doesn't change them.
+"""
+import time
+import itertools
+from collections import deque
+import numpy as np
+
+STAGES = ("capture", "detect", "landmarks", "gesture", "command", "applied", "audible")
+HISTORY = 2000  # finished events kept for the percentiles
+MAX_PENDING = 256  # events waiting for the audio thread; older ones are given up on
+POLL_INTERVAL = 0.5  # seconds between taking the audio thread's marks
+
+
+class LatencyTracer:
+    def __init__(self, selector, history=HISTORY):
+        self.selector = selector
+        self._ids = itertools.count(1)
+        self._pending = {}  # id -> event, until its mark comes back from the audio thread
+        self._events = deque(maxlen=history)
+        self._last = None  # stamps of the frame traced last, so a reused result isn't traced again
+        self._polled = time.perf_counter()
+        self.lost = 0
+
+    def begin(self, stamps):
+        """Start tracing the frame stamps describes (from HandTracker.get_latest_traced()). None if already traced."""
+        if stamps is None or stamps is self._last:
+            return None
+        self._last = stamps
+        event = dict(stamps)
+        self.selector.trace = event
+        return event
+
+    def end(self, event):
+        """Done with the frame: if it queued any command, mark the queue so the audio thread reports it."""
+        self.selector.trace = None
+        if event is not None and "command" in event:
+            trace_id = next(self._ids)
+            self._pending[trace_id] = event
+            self.selector.mark(trace_id)
+            while len(self._pending) > MAX_PENDING:
+                del self._pending[next(iter(self._pending))]
+                self.lost += 1
+        if self._pending and time.perf_counter() - self._polled >= POLL_INTERVAL:
+            self.poll()
+
+    def poll(self):
+        """Finish the events whose marks the audio thread has reached."""
+        self._polled = time.perf_counter()
+        for trace_id, applied, delay in self.selector.take_latency_marks():
+            event = self._pending.pop(int(trace_id), None)
+            if event is not None:
+                event["applied"] = applied
+                event["audible"] = applied + delay
+                self._events.append(event)
+
+    def snapshot(self):
+        """ms from each stage to the next and in total (capture to audible): count, mean, p50, p95, p99, max."""
+        if self._pending:
+            self.poll()
+        events = list(self._events)
+        stages = {}
+        for a, b in list(zip(STAGES, STAGES[1:])) + [("capture", "audible")]:
+            ms = np.array([1000.0 * (e[b] - e[a]) for e in events if a in e and b in e])
+            if not len(ms):
+                continue
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            stages[f"{a}-{b}"] = {"count": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(p50),
+                                  "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(ms.max())}
+        return {"events": len(events), "pending": len(self._pending), "lost": self.lost, "stages": stages}
+
+    def report(self):
+        """snapshot() as a printable table."""
+        snap = self.snapshot()
+        lines = [f"Gesture-to-sound latency over {snap['events']} events  "
+                 f"({snap['pending']} pending, {snap['lost']} lost; ms)",
+                 f"  {'stage':<20}  {'count':>6}  {'p50':>7}  {'p95':>7}  {'p99':>7}  {'max':>7}"]
+        for name, s in snap["stages"].items():
+            lines.append(f"  {name:<20}  {s['count']:6d}  {s['p50_ms']:7.2f}  {s['p95_ms']:7.2f}  "
+                         f"{s['p99_ms']:7.2f}  {s['max_ms']:7.2f}")
+        return "\n".join(lines)
+
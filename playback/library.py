@@ -0,0 +1,151 @@
+"""
+Persistent index of the song library, so pickers and waveforms need no decoding.
+
+One SQLite table holds per-song metadata (duration, BPM, which stems
+exist) and an overview waveform at the resolution the Waveform widget
+draws (peak of the summed left channel per 1000 engine samples), stored
+as float16. Each row carries a signature of its files' mtimes and sizes;
+update() rescans only songs whose signature changed, decoding them across
+a process pool, and drops rows for songs that are gone.
+"""
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+from playback import analysis
+from playback.track import SONGS_DIR, STEMS, stem_path
+
+INDEX_PATH = os.path.join(".cache", "library.sqlite")
+ENGINE_SR = 44100
+WAVEFORM_CHUNK = 1000  # engine samples per overview point, as SongSelector._build_waveform
+META_FILES = ("bpm.txt", analysis.SIDECAR)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (
+    name TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    duration REAL NOT NULL,
+    bpm REAL,
+    stems TEXT NOT NULL,
+    waveform BLOB NOT NULL,
+    scanned REAL NOT NULL
+)
+"""
+
+
+def list_songs():
+    if not os.path.isdir(SONGS_DIR):
+        return []
+    return sorted(s for s in os.listdir(SONGS_DIR)
+                  if not s.startswith(".") and os.path.isdir(os.path.join(SONGS_DIR, s)))
+
+
+def signature(song):
+    """mtime/size of every stem and metadata file; changes whenever a rescan is needed."""
+    parts = []
+    for name in [f"{stem}.mp3" for stem in STEMS] + list(META_FILES):
+        try:
+            st = os.stat(os.path.join(SONGS_DIR, song, name))
+        except OSError:
+            continue
+        parts.append(f"{name}:{st.st_mtime_ns}:{st.st_size}")
+    return "|".join(parts)
+
+
+def scan(song):
+    """Metadata row for one song; decodes each stem once. Runs in a worker process."""
+    sig = signature(song)
+    present = [stem for stem in STEMS if os.path.isfile(stem_path(song, stem))]
+    duration = 0.0
+    combined = None
+    for stem in present:
+        with sf.SoundFile(stem_path(song, stem)) as f:
+            duration = max(duration, f.frames / f.samplerate)
+            left = f.read(dtype="float32", always_2d=True)[:, 0]
+            block = WAVEFORM_CHUNK * f.samplerate / ENGINE_SR
+        if combined is None:
+            combined = left
+        else:
+            n = max(len(combined), len(left))
+            combined = np.pad(combined, (0, n - len(combined)))
+            combined[:len(left)] += left
+    if combined is None or not len(combined):
+        peaks = np.zeros(0, dtype=np.float16)
+    else:
+        starts = np.arange(0, len(combined), block).astype(np.intp)
+        peaks = np.maximum.reduceat(np.abs(combined), starts).astype(np.float16)
+    return {
+        "name": song,
+        "signature": sig,
+        "duration": duration,
+        "bpm": analysis.read_bpm(song),
+        "stems": ",".join(present),
+        "waveform": peaks.tobytes(),
+        "scanned": time.time(),
+    }
+
+
+class Library:
+    """SQLite-backed song index. Safe to share between threads."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def update(self, songs=None, workers=None):
+        """Rescan new or changed songs (default: all of songs/) and, on a full walk, forget removed ones.
+
+        Returns (number rescanned, number removed).
+        """
+        full = songs is None
+        songs = list_songs() if full else songs
+        with self._lock:
+            known = dict(self._db.execute("SELECT name, signature FROM songs"))
+        todo = [s for s in songs if known.get(s) != signature(s)]
+        present = set(songs)
+        gone = [s for s in known if s not in present] if full else []
+
+        rows = []
+        if len(todo) == 1 or workers == 1:
+            rows = [scan(s) for s in todo]
+        elif todo:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(scan, todo, chunksize=4))
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO songs VALUES (:name, :signature, :duration, :bpm, :stems, :waveform, :scanned)",
+                rows)
+            self._db.executemany("DELETE FROM songs WHERE name = ?", [(s,) for s in gone])
+        return len(rows), len(gone)
+
+    def songs(self):
+        """[(name, duration, bpm, stems)] for every indexed song, by name. No waveforms are read."""
+        with self._lock:
+            rows = self._db.execute("SELECT name, duration, bpm, stems FROM songs ORDER BY name").fetchall()
+        return [(name, duration, bpm, stems.split(",") if stems else []) for name, duration, bpm, stems in rows]
+
+    def get(self, song):
+        """Dict of song's metadata with the overview waveform as a float32 array, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT duration, bpm, stems, waveform FROM songs WHERE name = ?", (song,)).fetchone()
+        if row is None:
+            return None
+        duration, bpm, stems, waveform = row
+        return {
+            "duration": duration,
+            "bpm": bpm,
+            "stems": stems.split(",") if stems else [],
+            "waveform": np.frombuffer(waveform, dtype=np.float16).astype(np.float32),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
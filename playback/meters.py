@@ -0,0 +1,126 @@
+"""
+Output level meters and a spectrum analyzer, measured on what is actually played.
+
+Each block the audio callback hands every mixed deck's post-fader buffer
+and the final master buffer to Meters: peak and RMS go into one FrameRing
+record per block, and a decimated copy of the master goes into a
+SampleRing. Both are a couple of reductions and a copy on buffers the
+callback just wrote, with no allocation or locking.
+
+The spectrum is computed off the audio thread: an analyzer thread wakes
+INTERVAL times a second, copies the newest FFT_SIZE samples out of the
+ring and turns them into BANDS log-spaced band levels in dB. The UI only
+reads the latest snapshots (levels(), spectrum).
+
+Decimation takes every DECIMATE-th sample with no anti-alias filter, so
+content above sr / (2 * DECIMATE) folds back; that is fine for a display.
+"""
+import math
+import threading
+import numpy as np
+from playback.ring import FrameRing, SampleRing
+
+DECIMATE = 2
+FFT_SIZE = 2048  # 93 ms at 44.1 kHz / 2
+BANDS = 48
+LOW_HZ = 40.0
+FLOOR_DB = -72.0
+FALL_DB_PER_SECOND = 48.0  # how fast a band falls back when the sound stops
+INTERVAL = 1.0 / 30
+PEAK, RMS = 0, 1  # columns of a level record
+
+
+def to_db(x):
+    return max(FLOOR_DB, 20 * math.log10(x)) if x > 0 else FLOOR_DB
+
+
+def _peak_rms(block, row):
+    flat = block.reshape(-1)
+    row[PEAK] = max(float(flat.max()), -float(flat.min()))
+    row[RMS] = math.sqrt(float(np.dot(flat, flat)) / len(flat))
+
+
+class Meters:
+    """Level records for n_decks decks plus the master, and the master spectrum."""
+
+    def __init__(self, sr, n_decks):
+        self.sr = sr
+        self.n_decks = n_decks
+        self.level_ring = FrameRing((n_decks + 1, 2))
+        self.samples = SampleRing(8 * FFT_SIZE)
+        self._slot = None
+        self._frames_in = 0  # master frames seen, to keep the decimation phase across blocks
+        self._levels = np.zeros((n_decks + 1, 2), dtype=np.float32)
+
+        # Analyzer state, owned by the analyzer thread
+        self._window = np.hanning(FFT_SIZE).astype(np.float32)
+        self._frame = np.empty((FFT_SIZE, 2), dtype=np.float32)
+        bin_hz = sr / DECIMATE / FFT_SIZE
+        edges = np.geomspace(LOW_HZ, sr / DECIMATE / 2, BANDS + 1)
+        starts = np.ceil(edges[:-1] / bin_hz).astype(np.intp)
+        self._band_starts = np.maximum(starts, np.arange(BANDS) + starts[0])  # at least one bin per band
+        self.band_hz = edges[:-1]
+        self.spectrum = np.full(BANDS, FLOOR_DB, dtype=np.float32)  # replaced whole by the analyzer
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- audio thread --
+
+    def begin(self):
+        """Start this block's level record; decks that don't play stay at zero."""
+        self._slot = self.level_ring.slot()
+        self._slot.fill(0.0)
+
+    def deck(self, deck, block):
+        _peak_rms(block, self._slot[deck])
+
+    def master(self, block):
+        """Record the master block and publish the whole record."""
+        _peak_rms(block, self._slot[self.n_decks])
+        self.samples.write(block[-self._frames_in % DECIMATE::DECIMATE])
+        self._frames_in += len(block)
+        self.level_ring.publish()
+
+    # -- readers --
+
+    def levels(self):
+        """(n_decks + 1, 2) array of [peak, rms] per deck, then the master, for the newest block."""
+        snap = np.empty_like(self._levels)
+        if self.level_ring.latest(snap):
+            self._levels = snap
+        return self._levels
+
+    def analyze(self):
+        """Band levels in dB of the newest FFT_SIZE decimated samples, or None if they can't be read."""
+        if not self.samples.read_last(self._frame):
+            return None
+        mono = self._frame.mean(axis=1)
+        mono *= self._window
+        mag = np.abs(np.fft.rfft(mono))
+        bands = np.maximum.reduceat(mag, self._band_starts)
+        # A full-scale sine reads 0 dB through a Hann window
+        bands *= 4.0 / FFT_SIZE
+        return np.maximum(20 * np.log10(np.maximum(bands, 1e-9)), FLOOR_DB).astype(np.float32)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="spectrum", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        fall = FALL_DB_PER_SECOND * INTERVAL
+        seen = -1
+        while not self._stop.wait(INTERVAL):
+            if self.samples.written == seen:
+                continue  # stream stopped: keep the last picture
+            seen = self.samples.written
+            bands = self.analyze()
+            if bands is not None:
+                self.spectrum = np.maximum(bands, self.spectrum - fall)
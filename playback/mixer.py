@@ -0,0 +1,201 @@
+"""
+Mixing kernels run inside the audio callback.
+
+Everything here writes into preallocated scratch buffers so a steady-state
+block does no array allocation: the index/fraction arrays are computed once
+per deck and shared by every stem, and the per-stem gains are applied as a
+single weighted reduction (one matrix-vector product per interpolation tap).
+"""
+import math
+import numpy as np
+from playback.resample import sinc_table, cubic_table
+
+FLOAT32 = np.dtype(np.float32)
+
+# Realtime interpolation quality -> (taps, table phases). "linear" is the
+# 2-tap lerp below; the rest read a precomputed polyphase table. Cost grows
+# about linearly with taps (python -m tools.bench interp).
+INTERPOLATION = {"linear": (2, 0), "cubic": (4, 512), "sinc8": (8, 512), "sinc16": (16, 1024)}
+# Windowed-sinc tables are precomputed for these passband cutoffs; a deck
+# reading faster than 1x uses the widest one at or below 1 / rate, so
+# fast-forward and scratching don't alias.
+CUTOFFS = (1.0, 0.85, 0.7, 0.6, 0.5)
+
+
+class MixScratch:
+    """Per-callback work buffers, sized for the largest block seen so far."""
+
+    def __init__(self, n_stems=4, max_frames=4096):
+        self.n_stems = n_stems
+        self._alloc(max_frames)
+
+    def _alloc(self, max_frames):
+        self.max_frames = max_frames
+        self.ramp = np.arange(max_frames, dtype=np.float64)
+        self.rp = np.empty(max_frames, dtype=np.float64)
+        self.floor = np.empty(max_frames, dtype=np.float64)
+        self.i0 = np.empty(max_frames, dtype=np.intp)
+        self.i1 = np.empty(max_frames, dtype=np.intp)
+        self.t = np.empty((max_frames, 1), dtype=np.float32)
+        # Flat so any prefix can be viewed as a contiguous (n_stems, frames, 2) array.
+        # Keyed by dtype: compact stems are gathered raw, then converted to float32.
+        self._gathers = {}
+        self._gather_buffers(FLOAT32)
+        self.gains = np.empty(self.n_stems, dtype=np.float32)
+        self.a = np.empty((max_frames, 2), dtype=np.float32)
+        self.b = np.empty((max_frames, 2), dtype=np.float32)
+        self.fade = np.empty((max_frames, 2), dtype=np.float32)  # outgoing audio of a crossfaded jump
+
+    def ensure(self, frames):
+        """Grow the buffers if a block larger than any before arrives (rare; allocates once)."""
+        if frames > self.max_frames:
+            self._alloc(frames)
+
+    def _gather_buffers(self, dtype):
+        size = self.n_stems * self.max_frames * 2
+        bufs = (np.empty(size, dtype=dtype), np.empty(size, dtype=dtype))
+        self._gathers[dtype] = bufs
+        return bufs
+
+    def gather(self, n_stems, frames, dtype=FLOAT32):
+        bufs = self._gathers.get(dtype)
+        if bufs is None:
+            bufs = self._gather_buffers(dtype)  # first block from a new storage mode only
+        size = n_stems * frames * 2
+        return (bufs[0][:size].reshape(n_stems, frames, 2),
+                bufs[1][:size].reshape(n_stems, frames, 2))
+
+
+class Interpolator:
+    """Polyphase tables and work buffers for one interpolation quality."""
+
+    def __init__(self, quality, max_frames=4096):
+        self.quality = quality
+        self.taps, self.phases = INTERPOLATION[quality]
+        if quality == "cubic":
+            self.tables = [cubic_table(self.phases)]  # no passband control; plain cubic at every rate
+        else:
+            self.tables = [sinc_table(self.taps, self.phases, cutoff) for cutoff in CUTOFFS]
+        self._alloc(max_frames)
+
+    def _alloc(self, max_frames):
+        self.max_frames = max_frames
+        self.phase = np.empty(max_frames, dtype=np.intp)
+        self.weights = np.empty((max_frames, self.taps), dtype=np.float32)
+
+    def ensure(self, frames):
+        if frames > self.max_frames:
+            self._alloc(frames)
+
+    def table(self, rate):
+        if len(self.tables) == 1 or rate <= 1.0:
+            return self.tables[0]
+        for table, cutoff in zip(self.tables, CUTOFFS):
+            if cutoff <= 1.0 / rate:
+                return table
+        return self.tables[-1]
+
+
+def mix_stems(data, gains, pos, rate, frames, out, scratch, scale=1.0, loop_start=0.0, loop_length=0.0,
+              interp=None):
+    """Add the gain-weighted mix of data's stems, read from pos at rate, into out.
+
+    data is an (n_stems, n_samples, 2) block, gains an (n_stems,) float32
+    array. Compact dtypes (int16/float16) are converted only for the samples
+    gathered, with scale folded into the gains. Linear interpolation between
+    neighbouring samples, or interp's polyphase table (an Interpolator) if
+    given. A positive loop_length wraps read positions into
+    [loop_start, loop_start + loop_length), sample-accurately within the block.
+    Returns how many frames had audio (fewer than frames when the track
+    ends inside this block).
+    """
+    n = data.shape[1]
+    if rate <= 0:
+        return 0
+    if loop_length > 0:
+        count = frames  # the caller keeps the loop inside the track
+    else:
+        # Frames whose read position stays inside [0, n - 1)
+        remaining = n - 1 - pos
+        if remaining <= 0:
+            return 0
+        count = min(frames, math.ceil(remaining / rate))
+        if count <= 0:
+            return 0
+
+    rp = scratch.rp[:count]
+    np.multiply(scratch.ramp[:count], rate, out=rp)
+    rp += pos
+    if loop_length > 0:
+        rp -= loop_start
+        np.mod(rp, loop_length, out=rp)
+        rp += loop_start
+    fl = scratch.floor[:count]
+    np.floor(rp, out=fl)
+    i0 = scratch.i0[:count]
+    i1 = scratch.i1[:count]
+    np.copyto(i0, fl, casting='unsafe')
+    s = data.shape[0]
+    if scale != 1.0:
+        gains = np.multiply(gains, scale, out=scratch.gains[:s])
+    if interp is not None:
+        return _mix_polyphase(data, gains, rp, fl, i0, i1, rate, count, out, scratch, interp)
+    np.add(i0, 1, out=i1)
+    t = scratch.t[:count]
+    np.subtract(rp, fl, out=t[:, 0], casting='same_kind')
+
+    # One gather per tap covers every stem
+    g0, g1 = scratch.gather(s, count)
+    _take(data, i0, g0, scratch, s, count)
+    _take(data, i1, g1, scratch, s, count)
+
+    # Weighted reduction over stems, then lerp: a + t * (b - a)
+    a = scratch.a[:count]
+    b = scratch.b[:count]
+    np.dot(gains, g0.reshape(s, count * 2), out=a.reshape(count * 2))
+    np.dot(gains, g1.reshape(s, count * 2), out=b.reshape(count * 2))
+    b -= a
+    b *= t
+    b += a
+    out[:count] += b
+    return count
+
+
+def _take(data, idx, dst, scratch, s, count):
+    """Gather samples idx of every stem into the float32 buffer dst, converting compact dtypes."""
+    if data.dtype == FLOAT32:
+        np.take(data, idx, axis=1, out=dst, mode='clip')
+    else:
+        raw = scratch.gather(s, count, data.dtype)[0]
+        np.take(data, idx, axis=1, out=raw, mode='clip')
+        np.copyto(dst, raw)
+
+
+def _mix_polyphase(data, gains, rp, fl, i0, idx, rate, count, out, scratch, interp):
+    """Table-driven interpolation: per tap, gather every stem, reduce by gains, weight and accumulate."""
+    interp.ensure(count)
+    taps = interp.taps
+    # Fractional position -> table row
+    phase = interp.phase[:count]
+    frac = scratch.t[:count, 0]
+    np.subtract(rp, fl, out=frac, casting='same_kind')
+    frac *= interp.phases
+    np.rint(frac, out=frac)
+    np.copyto(phase, frac, casting='unsafe')
+    weights = interp.weights[:count]
+    np.take(interp.table(rate), phase, axis=0, out=weights)
+
+    s = data.shape[0]
+    g = scratch.gather(s, count)[1]
+    acc = scratch.a[:count]
+    tap = scratch.b[:count]
+    acc.fill(0.0)
+    first = -(taps // 2 - 1)
+    for k in range(taps):
+        np.add(i0, first + k, out=idx)
+        _take(data, idx, g, scratch, s, count)
+        np.dot(gains, g.reshape(s, count * 2), out=tap.reshape(count * 2))
+        tap *= weights[:, k:k + 1]
+        acc += tap
+    out[:count] += acc
+    return count
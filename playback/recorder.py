@@ -0,0 +1,122 @@
+"""
+Recording of the master output to WAV/FLAC without touching the disk from the audio callback.
+
+The callback copies each output block into a StreamRing sized for
+RING_SECONDS of audio; a writer thread drains it every WRITE_INTERVAL
+into the file in large writes. If the disk falls so far behind that the
+ring fills, blocks are dropped and counted as overflows. The ring logs
+where in the stream each drop happened and the writer puts the same
+number of frames of silence there, so every block lands in the file at
+its place in session time.
+
+start() and stop() only flip a flag; the callback starts and stops
+capturing on the next block boundary and stamps both ends with the
+session clock (frames the engine has played since it started), so a
+recording's start and stop times line up with everything else measured
+in session time.
+"""
+import time
+import threading
+import numpy as np
+import soundfile as sf
+from playback.ring import StreamRing
+
+RING_SECONDS = 10.0
+WRITE_INTERVAL = 0.25
+CHUNK_SECONDS = 1.0  # most audio handed to soundfile per write
+GAPS = 1024  # drop positions the ring remembers until the writer reaches them
+
+
+class Recorder:
+    def __init__(self, sr, channels=2, ring_seconds=RING_SECONDS):
+        self.sr = sr
+        self.channels = channels
+        self.ring = StreamRing(int(sr * ring_seconds), channels, gaps=GAPS)
+        self._chunk = np.empty((int(sr * CHUNK_SECONDS), channels), dtype=np.float32)
+        self._want = False  # set by start()/stop(), read by the audio thread
+        self._capturing = False  # audio thread: the ring is taking blocks
+        self._thread = None
+        self.path = None
+        self.started = None  # session frame of the first recorded sample
+        self.stopped = None  # session frame just past the last one
+        self.frames_written = 0
+
+    @property
+    def recording(self):
+        return self._thread is not None
+
+    def start(self, path, subtype=None):
+        """Begin recording to path (format from the extension) at the next audio block."""
+        if self.recording:
+            raise RuntimeError(f"Already recording to {self.path}")
+        f = sf.SoundFile(path, "w", samplerate=self.sr, channels=self.channels, subtype=subtype)
+        # Nothing writes the ring while stopped, so it can be reset from here
+        self.ring = StreamRing(self.ring.capacity, self.channels, gaps=GAPS)
+        self.path = path
+        self.started = self.stopped = None
+        self.frames_written = 0
+        self._want = True
+        self._thread = threading.Thread(target=self._write, args=(f,), name="recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self, running=True):
+        """Stop at the next audio block and wait for the file to be finished. Returns stats().
+
+        running=False means no callback will come (the stream is stopped or
+        rendering is over), so capture ends where the last block did.
+        """
+        if not self.recording:
+            return self.stats()
+        self._want = False
+        if not running and self._capturing:
+            self._capturing = False
+        self._thread.join()
+        self._thread = None
+        return self.stats()
+
+    def capture(self, block, clock):
+        """Audio thread: record block, which starts at session frame clock, if recording."""
+        if self._want:
+            if not self._capturing:
+                self.started = clock
+                self._capturing = True
+            self.ring.write(block)
+            self.stopped = clock + len(block)
+        elif self._capturing:
+            self._capturing = False
+
+    def _write(self, f):
+        ring = self.ring
+        with f:
+            while True:
+                done = not self._want and not self._capturing
+                while True:
+                    n = ring.read_into(self._chunk)
+                    if n:
+                        f.write(self._chunk[:n])
+                        self.frames_written += n
+                    gap = ring.take_gap()  # read_into stops at a drop: silence in its place
+                    if not n and not gap:
+                        break
+                    while gap:
+                        k = min(gap, len(self._chunk))
+                        self._chunk[:k] = 0.0
+                        f.write(self._chunk[:k])
+                        gap -= k
+                if done:
+                    break
+                time.sleep(WRITE_INTERVAL if self._want else 0.005)  # once stopping, only waiting for the callback
+
+    def stats(self):
+        started, stopped = self.started, self.stopped
+        return {
+            "path": self.path,
+            "recording": self.recording,
+            "started": None if started is None else started / self.sr,  # session seconds
+            "stopped": None if stopped is None or self._capturing else stopped / self.sr,
+            "seconds": 0.0 if started is None else (stopped - started) / self.sr,
+            "frames_written": self.frames_written,
+            "overflows": self.ring.overflows,
+            "dropped_frames": self.ring.dropped,
+            "buffer_high_water": self.ring.high_water / self.ring.capacity,
+        }
@@ -0,0 +1,157 @@
+"""
+Preallocated single-producer rings for getting data out of the audio callback.
+
+The callback is the only writer and must never wait. FrameRing and
+SampleRing, for displays that only want the newest data, have no read
+pointer: the writer always overwrites the oldest data, and readers copy
+what they want and then check, from the write counter, that the writer
+didn't reach it while they were copying. A failed read is simply retried
+on the reader's next pass. StreamRing, for data that must all reach its
+reader (recording), has one reader and refuses blocks when full instead.
+
+As with playback/commands.py this relies on CPython making a single
+attribute store atomic: data is written before the counter that publishes it.
+"""
+import numpy as np
+
+
+class FrameRing:
+    """Ring of fixed-shape records, e.g. one meter snapshot per audio block."""
+
+    def __init__(self, shape, capacity=8, dtype=np.float32):
+        self.capacity = capacity
+        self._buf = np.zeros((capacity,) + tuple(shape), dtype=dtype)
+        self.written = 0  # records published so far; written by the producer only
+
+    def slot(self):
+        """The record to fill next. Producer only; nothing sees it until publish()."""
+        return self._buf[self.written % self.capacity]
+
+    def publish(self):
+        self.written += 1
+
+    def latest(self, out):
+        """Copy the newest record into out. Returns False if there is none or it was overwritten meanwhile."""
+        written = self.written
+        if not written:
+            return False
+        out[...] = self._buf[(written - 1) % self.capacity]
+        # The producer fills slot `self.written`; it only reaches ours a full lap later
+        return self.written - written < self.capacity - 1
+
+
+class SampleRing:
+    """Continuous ring of (frames, channels) audio. A single write must be at most half the capacity."""
+
+    def __init__(self, capacity, channels=2, dtype=np.float32):
+        self.capacity = capacity
+        self._buf = np.zeros((capacity, channels), dtype=dtype)
+        self.written = 0  # total frames written; written by the producer only
+
+    def write(self, block):
+        """Append block, overwriting the oldest frames. Producer only."""
+        n = len(block)
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = block[:first]
+        if first < n:
+            self._buf[:n - first] = block[first:]
+        self.written += n
+
+    def read_last(self, out):
+        """Copy the newest len(out) frames into out, oldest first.
+
+        Returns False if fewer have been written or the writer overwrote
+        them while they were being copied.
+        """
+        n = len(out)
+        written = self.written
+        if written < n:
+            return False
+        start = (written - n) % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:] = self._buf[:n - first]
+        # Leave room for a block the writer may be in the middle of
+        return self.written - written + n <= self.capacity // 2
+
+
+class StreamRing:
+    """Bounded single-producer/single-consumer FIFO of (frames, channels) audio, for data that must all arrive.
+
+    The producer never waits: a block that doesn't fit is dropped whole and
+    counted, so the consumer can tell how much audio it missed. With gaps >
+    0 it also logs where in the stream each drop happened: read_into() then
+    stops at a gap, and take_gap() says how many frames are missing there.
+    """
+
+    def __init__(self, capacity, channels=2, dtype=np.float32, gaps=0):
+        self.capacity = capacity
+        self._buf = np.zeros((capacity, channels), dtype=dtype)
+        self.written = 0  # frames accepted; written by the producer only
+        self.read = 0  # frames consumed; written by the consumer only
+        self.dropped = 0  # frames refused because the ring was full
+        self.overflows = 0  # blocks refused
+        self.high_water = 0  # most frames ever waiting
+        self._gaps = np.zeros((gaps, 2), dtype=np.int64)  # (written when dropped, frames dropped there)
+        self.gaps = 0  # gaps logged; written by the producer only
+        self._gap_read = 0  # gaps consumed; written by the consumer only
+
+    def write(self, block):
+        """Append block, or drop and count it if there's no room. Producer only."""
+        n = len(block)
+        waiting = self.written - self.read + n
+        if waiting > self.capacity:
+            self.dropped += n
+            self.overflows += 1
+            if len(self._gaps):
+                self._log_gap(n)
+            return False
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = block[:first]
+        if first < n:
+            self._buf[:n - first] = block[first:]
+        self.written += n
+        if waiting > self.high_water:
+            self.high_water = waiting
+        return True
+
+    def _log_gap(self, n):
+        # A drop needs read < written, so the consumer can't be at a gap that is still growing
+        if self.gaps:
+            last = self._gaps[(self.gaps - 1) % len(self._gaps)]
+            if last[0] == self.written or self.gaps - self._gap_read == len(self._gaps):
+                last[1] += n  # same spot as the last drop, or no room left: the silence goes there
+                return
+        entry = self._gaps[self.gaps % len(self._gaps)]
+        entry[0] = self.written
+        entry[1] = n
+        self.gaps += 1
+
+    def read_into(self, out):
+        """Move up to len(out) of the oldest frames into out, stopping at a gap. Returns how many. Consumer only."""
+        written = self.written  # before looking at the gaps: any gap below it is logged by now
+        n = min(len(out), written - self.read)
+        if self._gap_read < self.gaps:
+            n = min(n, int(self._gaps[self._gap_read % len(self._gaps), 0]) - self.read)
+        start = self.read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+        self.read += n
+        return n
+
+    def take_gap(self):
+        """Frames dropped at the current read position, once; 0 if none. Consumer only."""
+        if self._gap_read < self.gaps:
+            at, n = self._gaps[self._gap_read % len(self._gaps)]
+            if at == self.read:
+                self._gap_read += 1
+                return int(n)
+        return 0
+
+    def __len__(self):
+        return self.written - self.read
@@ -1,48 +1,190 @@
-import os
-import sounddevice as sd
-import soundfile as sf
+import math
+import threading
+from time import perf_counter
 import numpy as np
+from playback import commands as cmd
+from playback.commands import CommandRing, Mailbox
+from playback.mixer import MixScratch, Interpolator, INTERPOLATION, mix_stems
+from playback import graph, stretch
+from playback.graph import MixerGraph
+from playback.meters import Meters
+from playback.recorder import Recorder
+from playback.ring import StreamRing
+from playback.stats import CallbackStats
+from playback.stretch import Stretcher
+from playback import analysis, backends, cache, submix, resample as offline
+from playback.track import Track, STEMS
+from playback.tracks import TrackCache
+
+DECKS = ("left", "right")
+LOOP_BEATS = (1, 2, 4, 8)
+LATENCY_MARKS = 1024  # latency marks the audio thread can hold before take_latency_marks()
+# Where a quantized command lands (see play(), pause(), mute(), trigger_memory_cue())
+QUANTIZE = {"now": 0, "beat": 1, "bar": 2}
+BEATS_PER_BAR = 4
+MAX_SCHEDULED = 64  # quantized commands waiting at once; more are applied right away
+SCHEDULE_LOG = 1024  # applied quantized commands kept for take_schedule_log()
+XFADE_FRAMES = 256  # crossfade length for jumps (seek, cue, scratching)
+FOUR_DECKS = ("left", "right", "left_b", "right_b")
+
+
+def _check_loop_beats(beats):
+    if beats not in LOOP_BEATS:
+        raise ValueError(f"Loop length must be one of {LOOP_BEATS} beats, not {beats!r}")
 
-STEMS = ["bass", "drums", "other", "vocals"]
 
 def _read_bpm(song):
-    path = f"songs/{song}/bpm.txt"
-    if not os.path.isfile(path):
-        return 120.0
-    with open(path) as f:
-        return float(f.read().strip())
-
-def _resample_stem(stem, new_len):
-    """Resample stem (samples, channels) to new_len samples. Preserves pitch (time-stretch)."""
-    old_len = len(stem)
-    if old_len == new_len:
-        return stem
-    indices = np.linspace(0, old_len - 1, new_len)
-    out = np.empty((new_len, stem.shape[1]), dtype=stem.dtype)
-    for ch in range(stem.shape[1]):
-        out[:, ch] = np.interp(indices, np.arange(old_len), stem[:, ch])
-    return out
+    """Detected BPM from the analysis sidecar (tools/analyze.py), else bpm.txt, else 120."""
+    return analysis.read_bpm(song, default=120.0)
+
+
+def _waveform(track):
+    """Peak of the summed left channel per 1000 samples, for the Waveform widget. Built once per track."""
+    if track.waveform is not None:
+        return track.waveform
+    if not track.length:
+        return []
+    # Summed in float32 a slab at a time, so compact int16/float16 stems
+    # neither overflow nor get expanded all at once.
+    chunk_size = 1000
+    slab = chunk_size * 1024
+    peaks = []
+    for start in range(0, track.length, slab):
+        combined = track.data[:, start:start + slab, 0].sum(axis=0, dtype=np.float32)
+        np.abs(combined, out=combined)
+        peaks.append(np.maximum.reduceat(combined, np.arange(0, len(combined), chunk_size)))
+    track.waveform = np.concatenate(peaks) * track.scale
+    return track.waveform
+
 
 class SongSelector:
-    def __init__(self, sr=44100):
+    def __init__(self, sr=44100, storage="float32", stream=True, decks=DECKS, library=None, track_cache=None,
+                 interpolation="linear", backend="sounddevice", backend_options=None,
+                 submix_budget=submix.DEFAULT_BUDGET):
+        """storage: stem sample format, "float32", or compact "float16"/"int16" for smaller machines.
+        stream=False opens no output at all; the caller drives _callback, as offline rendering does (playback/render.py).
+        backend: where the stream goes: "sounddevice" (the sound card), "null" or "file" (no hardware, a
+        simulated clock), or a factory; backend_options are passed to it (see playback/backends.py).
+        decks: deck names, e.g. FOUR_DECKS for a 4-deck mixer; the widgets use "left"/"right".
+        library: optional playback.library.Library; indexed songs show their overview waveform at once.
+        track_cache: a playback.tracks.TrackCache to share; by default each selector has its own.
+        interpolation: realtime read quality, a key of mixer.INTERPOLATION (see set_interpolation).
+        submix_budget: bytes of pre-mixed stem sets that decks read instead of every stem (see
+        playback/submix.py); 0 turns them off."""
         self.sr = sr
-        self.stems = {"left": [], "right": []}
-        self.bpm = {"left": None, "right": None}
-        self.playing = {"left": False, "right": False}
-        self.volumes = {"left": [1.0] * 4, "right": [1.0] * 4}
-        self.deck_volume = {"left": 1.0, "right": 1.0}
-        self.rate = {"left": 1.0, "right": 1.0}
-        self.position = {"left": 0.0, "right": 0.0}
-        self.cue_point = {"left": None, "right": None}  # memory cue: first press sets, later presses go back
-        self.waveforms = {"left": [], "right": []}
-
-        self.stream = sd.OutputStream(
-            samplerate=sr,
-            channels=2,
-            dtype='float32',
-            callback=self._callback
-        )
-        self.stream.start()
+        self.storage = storage
+        self.library = library
+        self.track_cache = track_cache if track_cache is not None else TrackCache()
+        self.decks = tuple(decks)
+        self._index = {side: i for i, side in enumerate(self.decks)}
+        n = len(self.decks)
+
+        # UI-side view of each deck. Control methods update these right away
+        # and queue the matching command; the audio thread keeps its own copy
+        # below and publishes position/playing back here.
+        self.tracks = {side: None for side in self.decks}
+        self.stems = {side: [] for side in self.decks}
+        self.bpm = {side: None for side in self.decks}
+        self.beats = {side: None for side in self.decks}  # beat times in seconds, None without an analysis
+        self.downbeat = {side: None for side in self.decks}
+        self.playing = {side: False for side in self.decks}
+        self.volumes = {side: [1.0] * len(STEMS) for side in self.decks}
+        self.deck_volume = {side: 1.0 for side in self.decks}
+        self.filters = {side: [0.0, 0.0] for side in self.decks}  # [high-pass, low-pass] corner in Hz, 0 = off
+        self.crossfader = 0.5
+        self.crossfader_curve = graph.CURVES[0]
+        self.rate = {side: 1.0 for side in self.decks}
+        self.keylock = {side: False for side in self.decks}  # tempo changes keep the pitch (see playback/stretch.py)
+        self.sync_ratio = {side: 1.0 for side in self.decks}  # bpm / synced bpm; playback reads at rate / ratio
+        self.position = {side: 0.0 for side in self.decks}
+        self.cue_point = {side: None for side in self.decks}  # memory cue: first press sets, later presses go back
+        self.loops = {side: None for side in self.decks}  # (start sample, length, beats, roll) while looping
+        self.waveforms = {side: [] for side in self.decks}
+        self.pending = {side: None for side in self.decks}  # background load in progress, see queue()
+        self._swap_lock = threading.Lock()
+
+        self.commands = CommandRing()
+        self.interpolation = "linear"
+        # (track, position scale, sync ratio, stop, beat grid) swapped in between blocks.
+        # The new position is the old one times the scale (0 for a fresh song);
+        # a sync ratio of None keeps the deck's current one, stop pauses the deck.
+        # The grid is (track samples per beat, a downbeat's track sample), for quantized commands.
+        self._staged = [Mailbox() for _ in self.decks]
+
+        # Audio-thread state as per-deck arrays. Only _callback touches these once the stream runs.
+        self._tracks = [None] * n
+        self._playing = np.zeros(n, dtype=bool)
+        self._rate = np.ones(n)
+        self._sync_ratio = np.ones(n)
+        self._position = np.zeros(n)
+        self._deck_volume = np.ones(n, dtype=np.float32)
+        self._loop_start = np.zeros(n)
+        self._loop_length = np.zeros(n)  # 0 = not looping
+        self._rolling = np.zeros(n, dtype=bool)
+        self._slip = np.zeros(n)  # where a loop roll would be without the loop
+        self._keylock = np.zeros(n, dtype=bool)
+        self._fade_from = np.zeros(n)  # where the pre-jump playhead is, while it fades out
+        self._fade_left = np.zeros(n, dtype=np.intp)
+        ramp = np.linspace(0.0, 1.0, XFADE_FRAMES, dtype=np.float32)[:, None]
+        self._fade_in, self._fade_out = ramp, 1.0 - ramp
+        # Every quality's tables are built up front so switching never computes on the audio thread
+        self._interpolators = [None if q == "linear" else Interpolator(q) for q in INTERPOLATION]
+        self._interp = None
+        self._stretchers = [Stretcher() for _ in range(n)]
+        self._gains = np.ones((n, len(STEMS)), dtype=np.float32)
+        self._mask = [submix.mask_of(gains) for gains in self._gains]  # _gains as a mute mask, for submixes
+        self._unity = np.ones(1, dtype=np.float32)  # gains for reading a submix
+        self.submixes = submix.SubmixCache(n, submix_budget)
+        self._active = []  # indices of playing decks; the only ones mixed each block
+        self._scratch = MixScratch(n_stems=len(STEMS))
+        self._graph = MixerGraph(sr, [graph.default_assign(side) for side in self.decks])
+        self.meters = Meters(sr, n)  # post-fader deck and master levels, master spectrum
+        self.recorder = Recorder(sr)
+        self._clock = 0  # session clock: frames output since the engine started
+        self.audio_stats = CallbackStats(sr)
+        # Gesture-to-sound tracing (playback/latency.py): the event the UI is handling, stamped on its first
+        # command, and (trace id, applied at, output delay) for every commands.MARK the audio thread reaches
+        self.trace = None
+        self.latency_marks = StreamRing(LATENCY_MARKS, channels=3, dtype=np.float64)
+        self._mark = np.zeros((1, 3))
+        self._block_start = 0.0
+        self._block_time = None
+        # Quantized commands. UI side: the default target for play/pause/mute/memory cue. Audio side: each
+        # deck's beat grid, the QUANTIZE waiting for its command, commands waiting for their boundary as
+        # [op, deck, arg, value, reference deck, target position, deadline frame, queued frame], and one
+        # row per applied one: (op, deck, queued, scheduled and actual session frame, late)
+        self.quantize = "now"
+        self._beat_length = np.zeros(n)  # track samples per beat, 0 = no grid
+        self._beat_origin = np.zeros(n)  # track sample of a downbeat
+        self._quantize_mode = 0
+        self._quantize_deck = 0
+        self._scheduled = []
+        self.schedule_log = StreamRing(SCHEDULE_LOG, channels=6, dtype=np.float64)
+        self._log_row = np.zeros((1, 6))
+        self.schedule_stats = {"scheduled": 0, "applied": 0, "late": 0, "unscheduled": 0, "max_error_frames": 0.0}
+
+        if interpolation != "linear":
+            self.set_interpolation(interpolation)
+        self.stream = None
+        if stream:
+            self.stream = backends.open_stream(backend, sr, self._callback, **(backend_options or {}))
+            self.meters.start()
+            self.submixes.start()
+
+    def _push(self, op, side, value=0.0, arg=0):
+        self._traced()
+        self.commands.push(op, self._index[side], value, arg)
+
+    def _push_at(self, quantize, op, side, value=0.0, arg=0):
+        """_push, applied at the next beat or bar of the deck (see QUANTIZE) instead of the next block."""
+        mode = QUANTIZE[quantize or self.quantize]
+        if mode:
+            self._push(cmd.QUANTIZE, side, 0.0, mode)
+        self._push(op, side, value, arg)
+
+    def _traced(self):
+        if self.trace is not None and "command" not in self.trace:
+            self.trace["command"] = perf_counter()
 
     def _sample_stem_at(self, stem, pos):
         """Linear interpolation at float position. pos in [0, len-1]."""
@@ -54,53 +196,305 @@ class SongSelector:
         t = pos - i0
         return (1 - t) * stem[i0] + t * stem[i1]
 
+    def _apply_command(self, op, deck, arg, value):
+        """Apply, or schedule if quantized, one queued command. Audio thread only."""
+        if op == cmd.QUANTIZE:
+            self._quantize_mode = arg
+            self._quantize_deck = deck
+            return
+        if self._quantize_mode:
+            mode = self._quantize_mode
+            self._quantize_mode = 0
+            if deck == self._quantize_deck and self._schedule(op, deck, arg, value, mode):
+                return
+        self._execute(op, deck, arg, value)
+
+    def _execute(self, op, deck, arg, value):
+        """Apply one command to the audio-thread state. Audio thread only."""
+        if op == cmd.PLAY:
+            if not self._playing[deck]:
+                self._playing[deck] = True
+                self._active.append(deck)
+        elif op == cmd.PAUSE:
+            self._set_stopped(deck)
+        elif op == cmd.SET_RATE:
+            self._rate[deck] = value
+        elif op == cmd.SET_SYNC:
+            self._sync_ratio[deck] = value
+        elif op == cmd.SET_STEM_VOLUME:
+            self._gains[deck][arg] = value
+            self._mask[deck] = submix.mask_of(self._gains[deck])
+        elif op == cmd.SET_DECK_VOLUME:
+            self._deck_volume[deck] = value
+        elif op == cmd.SEEK or op == cmd.SET_POSITION:
+            track = self._tracks[deck]
+            pos = self._position[deck] + value if op == cmd.SEEK else value
+            max_len = track.length if track is not None else 0
+            self._start_fade(deck)
+            self._position[deck] = max(0.0, min(pos, max_len - 1e-6))
+            self.position[self.decks[deck]] = float(self._position[deck])
+            self._loop_length[deck] = 0.0  # jumping out of a loop ends it
+        elif op == cmd.SET_LOOP or op == cmd.LOOP_ROLL:
+            roll = op == cmd.LOOP_ROLL
+            if roll and not (self._loop_length[deck] and self._rolling[deck]):
+                self._slip[deck] = self._position[deck]  # changing roll size keeps the original timeline
+            self._rolling[deck] = roll
+            self._loop_start[deck] = arg
+            self._loop_length[deck] = value
+        elif op == cmd.EXIT_LOOP:
+            if self._loop_length[deck] and self._rolling[deck]:
+                self._start_fade(deck)
+                self._position[deck] = self._slip[deck]
+                self.position[self.decks[deck]] = float(self._position[deck])
+            self._loop_length[deck] = 0.0
+        elif op == cmd.SET_CROSSFADER:
+            self._graph.crossfader = value
+        elif op == cmd.SET_CROSSFADER_CURVE:
+            self._graph.curve = graph.CURVES[arg]
+        elif op == cmd.SET_FILTER:
+            self._graph.filters[deck].set_cutoff(arg, value)
+        elif op == cmd.SET_INTERPOLATION:
+            self._interp = self._interpolators[arg]
+        elif op == cmd.SET_KEYLOCK:
+            self._keylock[deck] = bool(value)
+            self._stretchers[deck].reset(self._position[deck])
+        elif op == cmd.MARK:
+            self._reached_mark(arg)
+
+    def _schedule(self, op, deck, arg, value, mode):
+        """Hold a quantized command until the next beat (mode 1) or bar (2) of the deck's grid, or, while the
+        deck is stopped, the first playing deck's. Returns False to apply it now (nothing to quantize to)."""
+        ref = deck
+        if not self._playing[deck]:
+            ref = next((d for d in self._active if self._beat_length[d] > 0), None)
+        if ref is None or self._beat_length[ref] <= 0 or len(self._scheduled) >= MAX_SCHEDULED:
+            self.schedule_stats["unscheduled"] += 1
+            return False
+        rate = self._rate[ref] / self._sync_ratio[ref]
+        if rate <= 0:
+            self.schedule_stats["unscheduled"] += 1
+            return False
+        unit = self._beat_length[ref] * (BEATS_PER_BAR if mode == 2 else 1)
+        origin = self._beat_origin[ref]
+        pos = self._position[ref]
+        target = origin + (math.floor((pos - origin) / unit) + 1) * unit
+        # If the reference never gets there (a loop inside the bar, a jump back, a tempo drop), apply
+        # late once it is as overdue as it was far off
+        deadline = self._clock + math.ceil(2 * (target - pos) / rate)
+        self._scheduled.append([op, deck, arg, value, ref, target, deadline, self._clock])
+        self.schedule_stats["scheduled"] += 1
+        return True
+
+    def _due(self, frames):
+        """Take the scheduled commands that fall in this block: [(offset, exact offset, entry)], by offset."""
+        due = []
+        for entry in self._scheduled:
+            ref, target, deadline = entry[4], entry[5], entry[6]
+            rate = self._rate[ref] / self._sync_ratio[ref]
+            if self._playing[ref] and rate > 0:
+                # First output frame whose read position reaches the target
+                exact = max(0.0, (target - self._position[ref]) / rate)
+            else:
+                exact = 0.0  # the reference stopped: nothing left to wait for
+            if math.ceil(exact) < frames:
+                due.append((math.ceil(exact), exact, entry))
+            elif self._clock + frames > deadline:
+                due.append((0, exact, entry))
+        for item in due:
+            self._scheduled.remove(item[2])
+        due.sort(key=lambda item: item[0])
+        return due
+
+    def _apply_scheduled(self, offset, exact, entry):
+        op, deck = entry[0], entry[1]
+        self._execute(op, deck, entry[2], entry[3])
+        scheduled = self._clock + exact
+        actual = self._clock + offset
+        late = actual > scheduled + 1.0
+        stats = self.schedule_stats
+        stats["applied"] += 1
+        if late:
+            stats["late"] += 1
+        else:
+            stats["max_error_frames"] = max(stats["max_error_frames"], float(actual - scheduled))
+        row = self._log_row[0]
+        row[0] = op
+        row[1] = deck
+        row[2] = entry[7]
+        row[3] = scheduled
+        row[4] = actual
+        row[5] = late
+        self.schedule_log.write(self._log_row)
+
+    def _reached_mark(self, trace_id):
+        """This block carries the commands queued before the mark: note when it will be heard."""
+        t = self._block_time
+        delay = t.outputBufferDacTime - t.currentTime if t is not None else 0.0
+        if delay <= 0.0 and self.stream is not None:
+            delay = self.stream.latency  # backends that don't fill in the DAC time
+        row = self._mark[0]
+        row[0] = trace_id
+        row[1] = self._block_start
+        row[2] = delay
+        self.latency_marks.write(self._mark)
+
+    def _start_fade(self, deck):
+        """Keep playing the old position for a few ms, fading out under the new one."""
+        if self._playing[deck]:
+            self._fade_from[deck] = self._position[deck]
+            self._fade_left[deck] = XFADE_FRAMES
+
+    def _set_stopped(self, deck):
+        if self._playing[deck]:
+            self._playing[deck] = False
+            self._active.remove(deck)
+
     def _callback(self, outdata, frames, time, status):
-        outdata[:] = 0
-        for side in ["left", "right"]:
-            if not self.playing[side] or not self.stems[side]:
-                continue
-            rate = self.rate[side]
-            if rate <= 0:
-                continue
-            pos = self.position[side]
-            max_len = max(len(s) for s in self.stems[side])
-            if pos >= max_len:
-                self.playing[side] = False
-                continue
-            # Vectorized: compute all read positions at once
-            read_positions = pos + np.arange(frames, dtype=np.float64) * rate
-            valid = read_positions < max_len
-            if not np.any(valid):
-                self.playing[side] = False
+        start = perf_counter()
+        self._block_start = start
+        self._block_time = time
+        # Pick up new tracks first, then queued commands, so a play() issued
+        # right after select() applies to the new song.
+        for deck, box in enumerate(self._staged):
+            staged = box.take()
+            if staged is not None:  # may be the same track again: select() reloading the deck's song
+                self._tracks[deck], scale, ratio, stop, grid = staged
+                self._beat_length[deck], self._beat_origin[deck] = grid
+                self._position[deck] *= scale
+                self._loop_length[deck] = 0.0
+                self.position[self.decks[deck]] = float(self._position[deck])
+                if ratio is not None:
+                    self._sync_ratio[deck] = ratio
+                if stop:
+                    self._set_stopped(deck)
+        self.commands.drain(self._apply_command)
+        self._block_time = None  # only valid during this call
+
+        outdata.fill(0)
+        self._scratch.ensure(frames)
+        self._graph.ensure(frames)
+        self.meters.begin()
+        # Cost scales with playing decks, not configured ones. Iterate a copy
+        # since a deck that runs out removes itself.
+        due = self._due(frames) if self._scheduled else ()
+        decks = tuple(self._active)
+        if due:
+            # A deck about to start inside this block is mixed from that point
+            decks += tuple(sorted({entry[1] for _, _, entry in due} - set(decks)))
+        for deck in decks:
+            buf = self._graph.deck_buffer(frames)
+            if self._mix_split(deck, buf, frames, due) if due else self._mix_deck(deck, buf, frames):
+                self._graph.process_deck(deck, buf, self._deck_volume[deck])
+                self.meters.deck(deck, buf)
+                outdata += buf
+            self.position[self.decks[deck]] = float(self._position[deck])
+        self._graph.master(outdata)
+        self.meters.master(outdata)
+        self.recorder.capture(outdata, self._clock)
+        self._clock += frames
+        self.audio_stats.record(perf_counter() - start, frames, status)
+
+    def _mix_split(self, deck, outdata, frames, due):
+        """_mix_deck in pieces, applying deck's due scheduled commands at their exact frame in between."""
+        made = False
+        start = 0
+        for offset, exact, entry in due:
+            if entry[1] != deck:
                 continue
-            rp = read_positions[valid]
-            i0 = np.floor(rp).astype(np.int64)
-            t = (rp - i0).astype(np.float32)
-            n_valid = len(rp)
-            for i, stem_data in enumerate(self.stems[side]):
-                vol = self.volumes[side][i]
-                if vol == 0.0:
-                    continue
-                slen = len(stem_data)
-                mask = i0 < slen - 1
-                idx = np.minimum(i0[mask], slen - 2)
-                frac = t[mask]
-                samples = stem_data[idx] * (1 - frac[:, None]) + stem_data[idx + 1] * frac[:, None]
-                # Write into the valid portion of outdata
-                out_slice = outdata[:n_valid]
-                out_slice[mask] += samples * vol
-            self.position[side] = pos + frames * rate
-        outdata *= 0.5
-        np.clip(outdata, -1.0, 1.0, out=outdata)
-
-    def play(self, side):
+            if offset > start and self._playing[deck]:
+                made |= self._mix_deck(deck, outdata[start:offset], offset - start)
+            start = max(start, offset)
+            self._apply_scheduled(offset, exact, entry)
+        if start < frames and self._playing[deck]:
+            made |= self._mix_deck(deck, outdata[start:], frames - start)
+        return made
+
+    def _mix_deck(self, deck, outdata, frames):
+        """Mix deck's stems into outdata and advance it. Returns False if it made no sound."""
+        track = self._tracks[deck]
+        if track is None or not track.length:
+            return False
+        # Position is in track samples, so BPM sync is just a slower/faster read
+        rate = self._rate[deck] / self._sync_ratio[deck]
+        if rate <= 0:
+            return False
+        pos = self._position[deck]
+        if pos >= track.length - 1:
+            self._stop_at_end(deck)
+            return False
+        loop_start = self._loop_start[deck]
+        loop_length = self._loop_length[deck]
+        step = frames * rate
+        # Still streaming: if this block's span isn't decoded yet, stay silent
+        # and hold position while the decoders jump here.
+        keylock = self._keylock[deck]
+        if loop_length:
+            span = (int(loop_start), int(loop_start + loop_length) + 2)
+        elif keylock:
+            span = (max(0, int(pos) - stretch.FRAME), int(pos + step) + 2 * stretch.FRAME)
+        else:
+            span = (int(pos), int(pos + step) + 2)
+        if not track.available(*span):
+            track.request(span[0])
+            return False
+        # One pre-mixed array instead of every stem, when the builder has one for this mute mask
+        data, gains, scale = track.data, self._gains[deck], track.scale
+        mixed = self.submixes.get(deck, track, self._mask[deck])
+        if mixed is not None:
+            data, gains, scale = mixed, self._unity, 1.0
+        if keylock:
+            stretcher = self._stretchers[deck]
+            expected = stretcher.expected
+            if loop_length and expected >= loop_start:
+                expected = loop_start + (expected - loop_start) % loop_length
+            if abs(expected - pos) > 1.0:
+                stretcher.reset(pos)  # the deck jumped (seek, cue, loop exit)
+            stretcher.process(data, gains, rate, frames, outdata, self._scratch, scale, loop_start, loop_length)
+        elif not mix_stems(data, gains, pos, rate, frames, outdata, self._scratch, scale, loop_start, loop_length,
+                           self._interp):
+            self._stop_at_end(deck)
+            return False
+        if self._fade_left[deck]:
+            self._crossfade(deck, data, gains, scale, rate, frames, outdata)
+        pos += step
+        if loop_length:
+            # Same wrap as the read positions inside mix_stems
+            pos = loop_start + (pos - loop_start) % loop_length
+            if self._rolling[deck]:
+                self._slip[deck] = min(self._slip[deck] + step, track.length - 1)
+        self._position[deck] = pos
+        return True
+
+    def _crossfade(self, deck, data, gains, scale, rate, frames, outdata):
+        left = self._fade_left[deck]
+        n = min(frames, left)
+        done = XFADE_FRAMES - left
+        outdata[:n] *= self._fade_in[done:done + n]
+        old = self._scratch.fade[:n]
+        old.fill(0.0)
+        mix_stems(data, gains, self._fade_from[deck], rate, n, old, self._scratch, scale, interp=self._interp)
+        old *= self._fade_out[done:done + n]
+        outdata[:n] += old
+        self._fade_from[deck] += n * rate
+        self._fade_left[deck] = left - n
+
+    def _stop_at_end(self, deck):
+        self._set_stopped(deck)
+        self.playing[self.decks[deck]] = False
+
+    def play(self, side, quantize=None):
+        """quantize: "now", "beat" or "bar" (see QUANTIZE); None uses self.quantize. A quantized start on a
+        stopped deck lands on the beat grid of the first playing deck."""
         self.playing[side] = True
+        self._push_at(quantize, cmd.PLAY, side)
 
-    def pause(self, side):
+    def pause(self, side, quantize=None):
         self.playing[side] = False
+        self._push_at(quantize, cmd.PAUSE, side)
 
     def set_rate(self, side, rate):
         self.rate[side] = max(0.0, min(2.0, float(rate)))
+        self._push(cmd.SET_RATE, side, self.rate[side])
 
     def reset_tempo(self, side):
         """Reset deck to 1x (average BPM)."""
@@ -108,72 +502,275 @@ class SongSelector:
 
     def set_deck_volume(self, side, vol):
         self.deck_volume[side] = max(0.0, min(1.0, float(vol)))
+        self._push(cmd.SET_DECK_VOLUME, side, self.deck_volume[side])
+
+    def set_interpolation(self, quality):
+        """Realtime read quality for every deck: "linear", "cubic", "sinc8" or "sinc16".
+        Higher qualities alias less at extreme rates and cost more per sample."""
+        self.interpolation = quality
+        self._push(cmd.SET_INTERPOLATION, self.decks[0], 0.0, list(INTERPOLATION).index(quality))
+
+    def set_keylock(self, side, on):
+        """Keylock: rate and BPM sync change tempo only, via real-time WSOLA time-stretch.
+        Adds stretch.LATENCY samples of delay on this deck."""
+        self.keylock[side] = bool(on)
+        self._push(cmd.SET_KEYLOCK, side, 1.0 if on else 0.0)
+
+    def set_crossfader(self, x):
+        """Crossfader position: 0 = only decks on side A (left), 1 = only side B (right)."""
+        self.crossfader = max(0.0, min(1.0, float(x)))
+        self._push(cmd.SET_CROSSFADER, self.decks[0], self.crossfader)
+
+    def set_crossfader_curve(self, curve):
+        """"cut" (both sides full until the ends), "linear" or "constant_power"."""
+        self.crossfader_curve = curve
+        self._push(cmd.SET_CROSSFADER_CURVE, self.decks[0], 0.0, graph.CURVES.index(curve))
+
+    def set_highpass(self, side, hz):
+        """High-pass corner for the deck in Hz; 0 turns it off."""
+        self.filters[side][graph.HIGHPASS] = max(0.0, float(hz))
+        self._push(cmd.SET_FILTER, side, self.filters[side][graph.HIGHPASS], graph.HIGHPASS)
+
+    def set_lowpass(self, side, hz):
+        """Low-pass corner for the deck in Hz; 0 turns it off."""
+        self.filters[side][graph.LOWPASS] = max(0.0, float(hz))
+        self._push(cmd.SET_FILTER, side, self.filters[side][graph.LOWPASS], graph.LOWPASS)
 
     def cue(self, side):
         """Back to start: jump to 0 and stop."""
-        self.position[side] = 0.0
+        self.loops[side] = None
+        self._push(cmd.SET_POSITION, side, 0.0)
 
-    def trigger_memory_cue(self, side):
-        """First press: set breakpoint at current position. Later presses: jump back there and keep playing."""
+    def trigger_memory_cue(self, side, quantize=None):
+        """First press: set breakpoint at current position. Later presses: jump back there and keep playing,
+        now or on the next beat/bar (see play())."""
         if self.cue_point[side] is None:
             self.cue_point[side] = float(self.position[side])
         else:
-            self.position[side] = self.cue_point[side]
-            self.playing[side] = True
+            # Both commands land on the same frame, so the jump and restart are atomic
+            self.loops[side] = None
+            self._push_at(quantize, cmd.SET_POSITION, side, self.cue_point[side])
+            self.play(side, quantize)
 
     def reset_cue_point(self, side):
         """Clear the stored breakpoint for this deck."""
         self.cue_point[side] = None
 
-    def mute(self, side, stem_index):
+    def beat_samples(self, side):
+        """One beat of this deck's song, in track samples."""
+        return 60.0 * self.sr / self.bpm[side]
+
+    def _loop_bounds(self, side, beats, start=None):
+        """(start, length) of a beats-long loop on the beat at or before start (default: the playhead)."""
+        beat = self.beat_samples(side)
+        # Quantize to the detected beat grid if there is one, else to beats from 0
+        grid = self.beats[side][0] * self.sr if self.beats[side] is not None and len(self.beats[side]) else 0.0
+        pos = self.position[side] if start is None else start
+        start = max(0.0, grid + np.floor((pos - grid) / beat) * beat)
+        length = beats * beat
+        track = self.tracks[side]
+        if track is not None and start + length > track.length - 2:
+            start = max(0.0, track.length - 2 - length)  # keep the loop inside the track
+        return int(round(start)), length
+
+    def loop(self, side, beats=4, from_cue=False):
+        """Loop the current beat-quantized span of beats (1, 2, 4 or 8) until exit_loop().
+
+        The wrap happens inside the audio callback at sample accuracy.
+        from_cue starts the loop at the memory cue point instead of the playhead.
+        """
+        _check_loop_beats(beats)
+        if self.bpm[side] is None or not self.stems[side]:
+            return
+        at = self.cue_point[side] if from_cue and self.cue_point[side] is not None else None
+        start, length = self._loop_bounds(side, beats, at)
+        self.loops[side] = (start, length, beats, False)
+        self._push(cmd.SET_LOOP, side, length, start)
+
+    def loop_roll(self, side, beats=1):
+        """Loop roll: repeat the current beats-long span while held; exit_loop() then carries on
+        where the song would have been had it kept playing."""
+        _check_loop_beats(beats)
+        if self.bpm[side] is None or not self.stems[side]:
+            return
+        start, length = self._loop_bounds(side, beats)
+        self.loops[side] = (start, length, beats, True)
+        self._push(cmd.LOOP_ROLL, side, length, start)
+
+    def exit_loop(self, side):
+        self.loops[side] = None
+        self._push(cmd.EXIT_LOOP, side)
+
+    def mute(self, side, stem_index, quantize=None):
         self.volumes[side][stem_index] = 0.0
+        self._push_at(quantize, cmd.SET_STEM_VOLUME, side, 0.0, stem_index)
 
-    def unmute(self, side, stem_index):
+    def unmute(self, side, stem_index, quantize=None):
         self.volumes[side][stem_index] = 1.0
+        self._push_at(quantize, cmd.SET_STEM_VOLUME, side, 1.0, stem_index)
 
     def select(self, side, song):
-        self.playing[side] = False
+        """Load song on a deck. Returns as soon as decoding has started; playback
+        can begin right away and waits (silently) for any span not decoded yet."""
+        self.pause(side, "now")
+        with self._swap_lock:
+            self.pending[side] = None  # a direct load replaces any queued one
+            track = self.track_cache.acquire(song, self.sr, self.storage)
+            waveform = track.waveform  # already built if the track came from the cache
+            if waveform is None:
+                entry = self.library.get(song) if self.library is not None else None
+                waveform = entry["waveform"] if entry else []
+            # A new song is unsynced until apply_bpm_sync() runs again
+            self._install(side, song, track, waveform, 1.0)
+        threading.Thread(target=self._finish_load, args=(side, track), daemon=True).start()
+
+    def queue(self, side, song, sync=True):
+        """Load song onto a deck in the background while every deck keeps playing.
+
+        Decoding, tempo matching (to the other loaded decks, if sync) and the
+        waveform are done on a worker thread; the finished stems are then
+        swapped in between two audio blocks, with the deck paused at the
+        start of the new song. Until then pending[side] holds the load (see
+        loading()). Queueing again or select() on the same deck supersedes it.
+        """
+        job = {"song": song, "track": None}
+        self.pending[side] = job
+        threading.Thread(target=self._load_pending, args=(side, job, sync), daemon=True).start()
+
+    def loading(self, side):
+        """(song, fraction decoded) while a queued song is loading on this deck, else None."""
+        job = self.pending[side]
+        if job is None:
+            return None
+        track = job["track"]
+        return job["song"], (track.progress if track is not None else 0.0)
+
+    def _load_pending(self, side, job, sync):
+        song = job["song"]
+        try:
+            track = self.track_cache.acquire(song, self.sr, self.storage)
+        except (OSError, RuntimeError):
+            if self.pending[side] is job:
+                self.pending[side] = None
+            return
+        job["track"] = track
+        track.wait()
+        entry = self.library.get(song) if self.library is not None else None
+        waveform = entry["waveform"] if entry else _waveform(track)
+        ratio = self._matching_ratio(side, _read_bpm(song)) if sync else 1.0
+        with self._swap_lock:
+            if self.pending[side] is not job:
+                self.track_cache.release(track)
+                return
+            self.pending[side] = None
+            self.playing[side] = False
+            self._install(side, song, track, waveform, ratio)
+
+    def _matching_ratio(self, side, bpm):
+        """Sync ratio that plays bpm at the tempo the other loaded decks are synced to."""
+        others = [bpm_o / self.sync_ratio[o] for o, bpm_o in self.bpm.items()
+                  if o != side and bpm_o is not None and self.stems[o]]
+        if not others:
+            return 1.0
+        return bpm / (sum(others) / len(others))
+
+    def _install(self, side, song, track, waveform, ratio):
+        """Make track the deck's song: UI state now, audio state at the next block (paused, at 0)."""
         self.bpm[side] = _read_bpm(song)
-        loaded = []
-        for stem in STEMS:
-            data, sr = sf.read(f"songs/{song}/{stem}.mp3", dtype='float32')
-            if data.ndim == 1:
-                data = np.column_stack([data, data])
-            loaded.append(data)
-
-        self.stems[side] = loaded
+        info = analysis.load(song)
+        self.beats[side] = np.array(info["beats"]) if info else None
+        self.downbeat[side] = info["downbeat"] if info else None
+        old = self.tracks[side]
+        if old is not None:
+            self.track_cache.release(old)  # stays cached for a later reload unless memory runs short
+        self.tracks[side] = track
+        self.stems[side] = track.stems
         self.position[side] = 0.0
         self.cue_point[side] = None
-        self._build_waveform(side)
+        self.loops[side] = None
+        self.waveforms[side] = waveform
+        self.sync_ratio[side] = ratio
+        self._staged[self._index[side]].post((track, 0.0, ratio, True, self._grid(side)))
+
+    def _grid(self, side):
+        """(track samples per beat, downbeat or else first beat in track samples) for quantized commands."""
+        origin = self.downbeat[side]
+        if origin is None and self.beats[side] is not None and len(self.beats[side]):
+            origin = self.beats[side][0]
+        return self.beat_samples(side), (origin or 0.0) * self.sr
+
+    def _finish_load(self, side, track):
+        track.wait()
+        if self.tracks[side] is track and not len(self.waveforms[side]):
+            self._build_waveform(side)
 
     def _build_waveform(self, side):
-        if not self.stems[side]:
-            self.waveforms[side] = []
-            return
-        combined = sum(stem[:, 0] for stem in self.stems[side])
-        chunk_size = 1000
-        self.waveforms[side] = [np.max(np.abs(combined[i:i+chunk_size])) for i in range(0, len(combined), chunk_size)]
+        track = self.tracks[side]
+        self.waveforms[side] = _waveform(track) if track is not None else []
+
+    def _set_sync_ratio(self, side, ratio):
+        self.sync_ratio[side] = ratio
+        self._push(cmd.SET_SYNC, side, ratio)
 
-    def apply_bpm_sync(self):
-        """Resample both decks so they play at average BPM. Call after both select()s."""
-        if self.bpm["left"] is None or self.bpm["right"] is None:
+    def apply_bpm_sync(self, sides=None, resample=False, quality="balanced"):
+        """Make the given decks (default: all loaded) play at their average BPM at rate 1x.
+
+        By default the tempo ratio (bpm / avg_bpm) is folded into each deck's
+        read rate: O(1), no extra memory, playback keeps going and it can be
+        re-run at any time (e.g. after loading a new song mid-set). Position,
+        duration and seek stay in track time.
+
+        resample=True instead renders a tempo-synced copy of every stem with
+        the windowed-sinc resampler at the given quality ("fast", "balanced",
+        "best"), waiting for decoding to finish first. Rendered copies are
+        kept in the PCM cache per (song, ratio, quality), so syncing the same
+        pair again is just a memmap. The playhead keeps its place in the song.
+        """
+        sides = [side for side in (sides or self.decks) if self.bpm[side] is not None and self.stems[side]]
+        if len(sides) < 2:
             return
-        avg_bpm = (self.bpm["left"] + self.bpm["right"]) / 2.0
-        for side in ["left", "right"]:
-            if not self.stems[side]:
-                continue
+        avg_bpm = sum(self.bpm[side] for side in sides) / len(sides)
+        for side in sides:
             ratio = self.bpm[side] / avg_bpm
-            resampled = []
-            for stem in self.stems[side]:
-                new_len = int(len(stem) * ratio)
-                resampled.append(_resample_stem(stem, new_len))
-            self.stems[side] = resampled
-            self.position[side] = 0.0
+            if not resample:
+                self._set_sync_ratio(side, ratio)
+                continue
+            if round(ratio, 6) == 1.0:
+                self._set_sync_ratio(side, 1.0)  # already at the common tempo: only a folded ratio to undo
+                continue
+            source = self.tracks[side]
+            source.wait()
+            variant = f"sync:{ratio:.6f}:{quality}"
+            resampled = cache.load(source.paths, self.sr, variant, source.data.dtype) if source.paths else None
+            if resampled is None:
+                resampled = offline.resample(source.data, int(source.length * ratio), quality)
+                if source.paths:
+                    cache.store(source.paths, self.sr, resampled, variant)
+            track = Track(source.song, self.sr, resampled)
+            self.track_cache.release(source)
+            self.tracks[side] = track
+            self.stems[side] = track.stems
             self._build_waveform(side)
+            # The copy now plays at the common tempo; keep beat maths in its samples
+            self.bpm[side] = avg_bpm
+            if self.beats[side] is not None:
+                self.beats[side] = self.beats[side] * ratio
+                self.downbeat[side] *= ratio
+            if self.cue_point[side] is not None:
+                self.cue_point[side] *= ratio
+            self.loops[side] = None
+            # The new copy is ratio times longer; keep the playhead at the same musical spot
+            self._staged[self._index[side]].post((track, ratio, 1.0, False, self._grid(side)))
+            # Staged tracks are taken before queued commands: a SET_SYNC still queued from an
+            # earlier folded sync would land on the copy, so queue the reset behind it
+            self._set_sync_ratio(side, 1.0)
 
     def seek(self, side, ds):
+        self.loops[side] = None
+        self._push(cmd.SEEK, side, ds * self.sr)
+        # Move the UI copy too so the waveform follows before the next block publishes
         self.position[side] += ds * self.sr
-        max_len = max(len(s) for s in self.stems[side]) if self.stems[side] else 0
+        max_len = self.tracks[side].length if self.tracks[side] is not None else 0
         self.position[side] = max(0.0, min(self.position[side], max_len - 1e-6))
 
     def get_position(self, side):
@@ -184,8 +781,92 @@ class SongSelector:
     def get_duration(self, side):
         if not self.stems[side]:
             return 0.0
-        return max(len(s) for s in self.stems[side]) / self.sr
+        return self.tracks[side].length / self.sr
+
+    def memory_usage(self):
+        """Bytes held by each deck's stems (memmapped tracks count in full, though the OS may page them out)."""
+        return {side: (track.nbytes if track is not None else 0) for side, track in self.tracks.items()}
+
+    def get_track_cache_stats(self):
+        """Track cache counters: hits, misses, evictions, entries, bytes (resident), pinned_bytes, budget."""
+        return self.track_cache.stats()
+
+    def get_command_stats(self):
+        """Control-plane counters: ring traffic plus stem sets replaced before the audio thread took them."""
+        stats = self.commands.stats()
+        stats["coalesced"] += sum(box.coalesced for box in self._staged)
+        return stats
+
+    def get_submix_stats(self):
+        """Submix cache counters: entries, bytes, budget, builds, hits, evictions, skipped (too big), build_ms."""
+        return self.submixes.stats()
+
+    def take_schedule_log(self):
+        """Quantized commands applied since the last call: op, side, and the session frames it was queued at,
+        was due at (exact, from the reference deck's position and rate) and took effect at."""
+        out = np.empty((len(self.schedule_log), 6))
+        n = self.schedule_log.read_into(out)
+        return [{"op": int(op), "side": self.decks[int(deck)], "queued": int(queued), "scheduled": scheduled,
+                 "actual": int(actual), "error_frames": actual - scheduled, "late": bool(late)}
+                for op, deck, queued, scheduled, actual, late in out[:n].tolist()]
+
+    def get_schedule_stats(self):
+        """Quantized command counters: scheduled, applied, late (their reference deck never got to the
+        boundary), unscheduled (applied at once: no playing deck or grid to quantize to), pending,
+        max_error_frames (actual minus exact due frame, always in [0, 1) when on time)."""
+        stats = dict(self.schedule_stats)
+        stats["pending"] = len(self._scheduled)
+        return stats
+
+    def get_levels(self, side=None):
+        """(peak, rms) of side's last block after its filters and fader, or of the master output with side=None."""
+        row = self.meters.levels()[self.meters.n_decks if side is None else self._index[side]]
+        return float(row[0]), float(row[1])
+
+    def get_spectrum(self):
+        """Master output band levels in dB (one per meters.BANDS band), refreshed by the analyzer thread."""
+        return self.meters.spectrum
+
+    def get_audio_stats(self):
+        """Callback health: xruns (underflows + overflows from the stream's status flags), overruns
+        (callbacks slower than their block), block size, callback ms (last/mean/max/p50/p95/p99, histogram)
+        and load (callback time / block duration). Lock-free; fields may be a block apart."""
+        return self.audio_stats.snapshot()
+
+    def mark(self, trace_id):
+        """Queue a latency mark after the commands queued so far (see playback/latency.py)."""
+        self.commands.push(cmd.MARK, 0, 0.0, trace_id)
+
+    def take_latency_marks(self):
+        """[trace id, perf_counter time applied, output delay seconds] for each mark reached since the last call."""
+        out = np.empty((len(self.latency_marks), 3))
+        n = self.latency_marks.read_into(out)
+        return out[:n].tolist()
+
+    def get_session_time(self):
+        """Seconds of audio output since the engine started; recordings are stamped on this clock."""
+        return self._clock / self.sr
+
+    def start_recording(self, path, subtype=None):
+        """Record the master output to path (WAV/FLAC/... from the extension) from the next block on."""
+        self.recorder.start(path, subtype)
+
+    def stop_recording(self):
+        """Finish the recording. Returns its stats (see get_recording_stats)."""
+        return self.recorder.stop(running=self.stream is not None and self.stream.active)
+
+    def get_recording_stats(self):
+        """Path, session start/stop seconds, frames written and overflows (blocks dropped because the disk fell behind)."""
+        return self.recorder.stats()
 
     def close(self):
-        self.stream.stop()
-        self.stream.close()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+        self.recorder.stop(running=False)
+        self.meters.stop()
+        self.submixes.stop()
+        for track in self.tracks.values():
+            if track is not None:
+                self.track_cache.release(track)
+        self.track_cache.clear()
@@ -0,0 +1,184 @@
+"""
+Tracks whose stems live in shared memory, so the engine process (playback/engine.py) plays them without a copy.
+
+SharedTrack decodes into a multiprocessing.shared_memory segment exactly as
+Track decodes into a private block, and describe() gives another process
+what it needs to map the same pages (attach()). Songs already in the PCM
+cache are memory-mapped files, shared through the OS page cache, and are
+described by path. Any other track is copied into a segment once.
+
+While a song is still streaming the engine must know which spans are
+decoded, and the decoders must hear about seeks past the frontier. Both go
+through a small int64 control segment: each stem's decoded ranges,
+rewritten under a sequence lock (SEQ is odd while a writer is busy, and a
+reader that sees it change retries later), and the position the engine
+wants decoded next.
+
+Arrays are built on the segment's mmap itself, so a mapping lives exactly
+as long as the arrays using it, like np.memmap; the creating process
+unlinks its segments when the track is garbage collected, and mappings
+elsewhere stay valid until they are dropped too.
+"""
+import threading
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+from playback.track import Track
+
+MAX_RANGES = 32  # per stem; past this the first MAX_RANGES are published, under-reporting what's decoded
+SEQ, WANT, HEADER = 0, 1, 2  # control segment: int64 header slots, then counts, then ranges
+NO_WANT = -1
+
+_copies = weakref.WeakKeyDictionary()  # plain track -> its SharedTrack copy, kept as long as the track
+
+
+def create(size):
+    """(SharedMemory, mmap) for a new zero-filled segment of size bytes."""
+    return _detach(shared_memory.SharedMemory(create=True, size=max(1, size)))
+
+
+def attach(name):
+    """(SharedMemory, mmap) for an existing segment."""
+    return _detach(shared_memory.SharedMemory(name=name))
+
+
+def _detach(shm):
+    # Hand the mapping over to the arrays that will be built on it. The
+    # SharedMemory object is then only a name to unlink(), and closing it
+    # can never fail on views that outlive it.
+    mm = shm._mmap
+    shm._buf.release()
+    shm._buf = shm._mmap = None
+    shm.close()
+    return shm, mm
+
+
+def _control_size(n_stems):
+    return 8 * (HEADER + n_stems + n_stems * MAX_RANGES * 2)
+
+
+class SharedTrack(Track):
+    """A Track whose stems and decode progress other processes can map (see attach())."""
+
+    def __init__(self, song, sr, data, frames=None, ranges=None, owner=None, control=None):
+        """owner: the data segment when this process created it. control: the control segment's name when
+        attaching to a track that is still streaming; a streaming track created here makes its own."""
+        super().__init__(song, sr, data, frames, ranges, owner)
+        self._ctrl = None
+        self._control = None
+        self._seen = None  # SEQ of the ranges last copied from the control segment
+        self._attached = control is not None  # progress is read from, not written to, the control segment
+        if owner is not None:
+            weakref.finalize(self, owner.unlink)
+        if control is not None:
+            self._control, mm = attach(control)
+            self._map_control(mm)
+            self._sync()
+        elif ranges is not None:
+            self._control, mm = create(_control_size(len(data)))
+            weakref.finalize(self, self._control.unlink)
+            self._map_control(mm)
+            self._publish_lock = threading.Lock()
+            self._ctrl[WANT] = NO_WANT
+
+    def _map_control(self, mm):
+        n = len(self.data)
+        ctrl = np.ndarray((_control_size(n) // 8,), dtype=np.int64, buffer=mm)
+        self._ctrl = ctrl
+        self._counts = ctrl[HEADER:HEADER + n]
+        self._spans = ctrl[HEADER + n:].reshape(n, MAX_RANGES, 2)
+
+    @classmethod
+    def _allocate(cls, shape, dtype):
+        dtype = np.dtype(dtype)
+        shm, mm = create(int(np.prod(shape)) * dtype.itemsize)
+        return np.ndarray(shape, dtype=dtype, buffer=mm), shm
+
+    @classmethod
+    def copy_of(cls, track):
+        """A fully-loaded SharedTrack holding a copy of track's stems."""
+        data, shm = cls._allocate(track.data.shape, track.data.dtype)
+        data[...] = track.data
+        return cls(track.song, track.sr, data, frames=track._frames, owner=shm)
+
+    @classmethod
+    def attach(cls, desc):
+        """Map the track describe() described, in another process. Cached songs come back as plain Tracks."""
+        shape, dtype = tuple(desc["shape"]), np.dtype(desc["dtype"])
+        if desc["file"] is not None:
+            data = np.memmap(desc["file"], dtype=dtype, mode="r", shape=shape, offset=desc["offset"])
+            return Track(desc["song"], desc["sr"], data, frames=desc["frames"])
+        _, mm = attach(desc["data"])
+        data = np.ndarray(shape, dtype=dtype, buffer=mm)
+        ranges = None if desc["control"] is None else [() for _ in range(shape[0])]
+        return cls(desc["song"], desc["sr"], data, frames=desc["frames"], ranges=ranges, control=desc["control"])
+
+    # -- progress shared through the control segment --
+
+    def available(self, start, stop):
+        if self._attached and self._ctrl[SEQ] != self._seen:
+            self._sync()
+        return super().available(start, stop)
+
+    def _sync(self):
+        """Copy the published ranges, unless a writer is busy with them (then next time)."""
+        seq = int(self._ctrl[SEQ])
+        if seq & 1:
+            return
+        ranges = [tuple((int(a), int(b)) for a, b in spans[:min(int(count), MAX_RANGES)])
+                  for spans, count in zip(self._spans, self._counts)]
+        if int(self._ctrl[SEQ]) == seq:
+            self._ranges = ranges
+            self._seen = seq
+
+    def request(self, pos):
+        super().request(pos)
+        if self._ctrl is not None:
+            self._ctrl[WANT] = int(pos)
+
+    def _next_start(self, i, cursor):
+        if self._ctrl is not None:
+            want = int(self._ctrl[WANT])
+            if want != NO_WANT:
+                self._want = want  # a seek the engine asked for
+        return super()._next_start(i, cursor)
+
+    def _mark(self, i, start, stop):
+        super()._mark(i, start, stop)
+        if self._ctrl is None:
+            return
+        ranges = self._ranges[i][:MAX_RANGES]
+        with self._publish_lock:
+            self._ctrl[SEQ] += 1
+            if ranges:
+                self._spans[i, :len(ranges)] = ranges
+            self._counts[i] = len(ranges)
+            self._ctrl[SEQ] += 1
+
+
+def describe(track):
+    """Plain-value description of track's stems for SharedTrack.attach() in another process."""
+    data = track.data
+    desc = {
+        "song": track.song,
+        "sr": track.sr,
+        "shape": list(data.shape),
+        "dtype": data.dtype.name,
+        "frames": list(track._frames),
+        "file": None,
+        "offset": 0,
+        "data": None,
+        "control": None,
+    }
+    if isinstance(data, np.memmap) and data.filename is not None:
+        desc["file"], desc["offset"] = data.filename, data.offset
+        return desc
+    if not isinstance(track, SharedTrack) or track._owner is None:
+        copy = _copies.get(track)
+        if copy is None:
+            copy = _copies[track] = SharedTrack.copy_of(track)
+        track = copy
+    desc["data"] = track._owner.name
+    if track._control is not None and not track.done:
+        desc["control"] = track._control.name
+    return desc
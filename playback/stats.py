@@ -0,0 +1,107 @@
+"""
+Audio callback instrumentation: xruns, callback duration and load.
+
+The callback times itself and calls CallbackStats.record() once per
+block. Everything is plain counters and a preallocated histogram written
+by the audio thread only; readers copy them without a lock, so a snapshot
+can be a block out of step between fields, which doesn't matter for what
+it's used for.
+
+The histogram has log-spaced bins, BINS_PER_OCTAVE per doubling from
+MIN_US, so percentiles are accurate to within one bin (about 19%) from
+microseconds up to far past any realistic block duration.
+"""
+import math
+import numpy as np
+
+MIN_US = 10.0
+BINS_PER_OCTAVE = 4
+N_BINS = 64  # top bin starts at MIN_US * 2 ** 15.75, about half a second
+
+
+def bin_edges():
+    """Lower edge in microseconds of every histogram bin, plus the top's upper edge."""
+    return MIN_US * 2.0 ** (np.arange(N_BINS + 1) / BINS_PER_OCTAVE)
+
+
+class CallbackStats:
+    def __init__(self, sr):
+        self.sr = sr
+        self.histogram = np.zeros(N_BINS, dtype=np.int64)
+        self.calls = 0
+        self.underflows = 0  # the sound card ran out of output: an audible dropout
+        self.overflows = 0
+        self.overruns = 0  # callbacks that took longer than the audio they produced
+        self.total_seconds = 0.0
+        self.total_frames = 0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.block_frames = 0
+        self.min_frames = 0
+        self.max_frames = 0
+        self.load = 0.0  # last callback's time / its block's duration
+        self.max_load = 0.0
+
+    def record(self, seconds, frames, status):
+        """Audio thread, once per callback: time taken, block size and the callback's status flags."""
+        if status:
+            if status.output_underflow:
+                self.underflows += 1
+            if status.output_overflow:
+                self.overflows += 1
+        us = seconds * 1e6
+        b = int(BINS_PER_OCTAVE * math.log2(us / MIN_US)) if us > MIN_US else 0
+        self.histogram[min(b, N_BINS - 1)] += 1
+        load = seconds * self.sr / frames if frames else 0.0
+        if load > 1.0:
+            self.overruns += 1
+        if load > self.max_load:
+            self.max_load = load
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+        if frames < self.min_frames or not self.calls:
+            self.min_frames = frames
+        if frames > self.max_frames:
+            self.max_frames = frames
+        self.load = load
+        self.block_frames = frames
+        self.last_seconds = seconds
+        self.total_seconds += seconds
+        self.total_frames += frames
+        self.calls += 1
+
+    def percentile(self, q, histogram=None):
+        """Callback duration in ms below which q percent of callbacks finished (upper edge of that bin)."""
+        histogram = self.histogram.copy() if histogram is None else histogram
+        total = int(histogram.sum())
+        if not total:
+            return 0.0
+        b = int(np.searchsorted(np.cumsum(histogram), math.ceil(total * q / 100.0)))
+        return float(bin_edges()[min(b, N_BINS - 1) + 1]) / 1000.0
+
+    def snapshot(self):
+        histogram = self.histogram.copy()
+        calls = self.calls
+        total_frames = self.total_frames
+        block_ms = 1000.0 * self.block_frames / self.sr
+        return {
+            "calls": calls,
+            "xruns": self.underflows + self.overflows,
+            "underflows": self.underflows,
+            "overflows": self.overflows,
+            "overruns": self.overruns,
+            "block_frames": self.block_frames,
+            "min_block_frames": self.min_frames,
+            "max_block_frames": self.max_frames,
+            "block_ms": block_ms,
+            "last_ms": 1000.0 * self.last_seconds,
+            "mean_ms": 1000.0 * self.total_seconds / calls if calls else 0.0,
+            "max_ms": 1000.0 * self.max_seconds,
+            "p50_ms": self.percentile(50, histogram),
+            "p95_ms": self.percentile(95, histogram),
+            "p99_ms": self.percentile(99, histogram),
+            "load": self.load,
+            "mean_load": self.total_seconds * self.sr / total_frames if total_frames else 0.0,
+            "max_load": self.max_load,
+            "histogram": histogram.tolist(),
+        }
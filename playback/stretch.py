@@ -0,0 +1,104 @@
+"""
+Real-time, pitch-preserving time-stretch (WSOLA) for keylock playback.
+
+A deck in keylock mode reads its stems at the original speed and changes
+tempo by choosing where each output frame is taken from: output frames are
+laid down every HOP samples with a Hann window (50% overlap), while the
+source position advances HOP * rate per frame. Each frame's source
+position is nudged within +-TOLERANCE samples to the offset whose audio
+best continues the previous frame (cross-correlation on the mono mix), so
+waveforms line up and pitch stays put.
+
+The stretch runs once on a deck's mixed stems, not per stem, so its cost
+does not grow with the stem count. All state (overlap-add tail, the
+previous frame's position, pending output) carries across blocks; the
+added latency is FRAME - HOP samples.
+"""
+import math
+import numpy as np
+from playback.mixer import mix_stems
+
+FRAME = 1024
+HOP = FRAME // 2
+TOLERANCE = 256
+LATENCY = FRAME - HOP  # samples between a source frame being read and it being fully heard
+
+
+class Stretcher:
+    """WSOLA state for one deck."""
+
+    def __init__(self, max_frames=4096, max_rate=2.0):
+        self.window = np.hanning(FRAME + 1)[:FRAME].astype(np.float32)[:, None]  # periodic: sums to 1 at 50% overlap
+        self._ola = np.zeros((FRAME, 2), dtype=np.float32)
+        self._frame = np.empty((FRAME, 2), dtype=np.float32)
+        self.max_rate = max_rate
+        self._alloc(max_frames)
+        self.reset(0.0)
+
+    def _alloc(self, max_frames):
+        self.max_frames = max_frames
+        hops = max_frames // HOP + 2
+        span = int(math.ceil(hops * HOP * self.max_rate)) + FRAME + 2 * TOLERANCE + HOP + 2
+        self._src = np.empty((span, 2), dtype=np.float32)
+        self._mono = np.empty(span, dtype=np.float32)
+        self._fifo = np.zeros((max_frames + HOP, 2), dtype=np.float32)
+
+    def ensure(self, frames, rate):
+        if frames > self.max_frames or rate > self.max_rate:
+            self.max_rate = max(self.max_rate, rate)
+            self._alloc(max(frames, self.max_frames))
+
+    def reset(self, pos):
+        """Start over from source position pos (after a seek, a loop exit or enabling keylock)."""
+        self.expected = pos  # deck position the next block should start at
+        self._next = pos  # nominal source position of the next frame
+        self._prev = None  # source position the last frame was taken from
+        self._ola.fill(0.0)
+        self._pending = 0  # finished output samples waiting in _fifo
+
+    def process(self, data, gains, rate, frames, out, scratch, scale=1.0, loop_start=0.0, loop_length=0.0):
+        """Add frames of output, stretched by rate, into out. Source reads wrap in a loop like mix_stems."""
+        self.ensure(frames, rate)
+        analysis_hop = HOP * rate
+        hops = max(0, math.ceil((frames - self._pending) / HOP))
+
+        if hops:
+            # One stem mix covers every frame this block might pick
+            lo = int(math.floor(self._next)) - TOLERANCE
+            if self._prev is not None:
+                lo = min(lo, self._prev + HOP)
+            # ...and every template: a frame's continuation can reach HOP past its window
+            hi = int(math.ceil(self._next + (hops - 1) * analysis_hop)) + TOLERANCE + HOP + FRAME + 1
+            n = hi - lo
+            src = self._src[:n]
+            src.fill(0.0)
+            scratch.ensure(n)  # the span runs a frame and more past the block, further at high rates
+            mix_stems(data, gains, float(lo), 1.0, n, src, scratch, scale, loop_start, loop_length)
+            mono = self._mono[:n]
+            np.add(src[:, 0], src[:, 1], out=mono)
+
+            for _ in range(hops):
+                nominal = int(round(self._next))
+                if self._prev is None:
+                    start = nominal
+                else:
+                    # Offset whose audio best continues the previous frame
+                    t0 = self._prev + HOP - lo
+                    r0 = nominal - TOLERANCE - lo
+                    corr = np.correlate(mono[r0:r0 + FRAME + 2 * TOLERANCE], mono[t0:t0 + FRAME], "valid")
+                    start = nominal - TOLERANCE + int(np.argmax(corr))
+                np.multiply(src[start - lo:start - lo + FRAME], self.window, out=self._frame)
+                self._ola += self._frame
+                self._fifo[self._pending:self._pending + HOP] = self._ola[:HOP]
+                self._pending += HOP
+                self._ola[:FRAME - HOP] = self._ola[HOP:]
+                self._ola[FRAME - HOP:] = 0.0
+                self._prev = start
+                self._next += analysis_hop
+
+        out[:frames] += self._fifo[:frames]
+        rest = self._pending - frames
+        if rest > 0:
+            self._fifo[:rest] = self._fifo[frames:self._pending]
+        self._pending = rest
+        self.expected += frames * rate
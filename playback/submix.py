@@ -0,0 +1,164 @@
+"""
+Pre-mixed stereo copies of a track under a stem mute mask, so a deck reads one array instead of every stem.
+
+Most of the time every stem of a deck plays at unity gain, yet mix_stems
+gathers and interpolates each of them every block. Interpolation is
+linear in the samples, so reading a pre-summed stereo track gives the same
+output for a fraction of the work. A builder thread renders the submix for
+the mask a deck is playing with, once its track is fully decoded; until
+then, and right after any mute change, the callback mixes stems as before.
+
+Only masks are built (every stem gain 0 or 1, at least one stem on): that
+is what StemButton produces, and gains in between change too often to be
+worth rendering. Submixes are float32 (1, frames, 2) blocks with the
+track's storage scale applied, kept in LRU order under a memory budget;
+one a deck is reading is never evicted.
+
+The hand-off follows playback/commands.py: the callback publishes what each
+deck wants and picks up what the builder published, both single list-item
+stores, so it never waits.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from time import perf_counter, sleep
+import numpy as np
+
+DEFAULT_BUDGET = 512 << 20  # bytes
+NO_MASK = -1  # gains that aren't a plain mute mask
+INTERVAL = 0.05  # seconds between builder checks
+SLAB = 1 << 16  # frames summed at a time, so the audio thread gets the GIL back often
+
+
+def mask_of(gains):
+    """Bit i set if stem i is on at unity gain; NO_MASK unless every gain is 0 or 1."""
+    mask = 0
+    for i, gain in enumerate(gains):
+        if gain == 1.0:
+            mask |= 1 << i
+        elif gain != 0.0:
+            return NO_MASK
+    return mask
+
+
+def render(track, mask):
+    """(1, frames, 2) float32 sum of the stems in mask, scaled to float audio."""
+    data = track.data
+    out = np.zeros((1, data.shape[1], 2), dtype=np.float32)
+    mix = out[0]
+    stems = [i for i in range(len(data)) if mask >> i & 1]
+    for start in range(0, data.shape[1], SLAB):
+        slab = mix[start:start + SLAB]
+        for i in stems:
+            np.add(slab, data[i, start:start + SLAB], out=slab)
+        if track.scale != 1.0:
+            slab *= track.scale
+        sleep(0)
+    return out
+
+
+class SubmixCache:
+    def __init__(self, n_decks, budget=DEFAULT_BUDGET):
+        """budget: bytes of submixes kept; 0 turns submixes off."""
+        self.budget = budget
+        self.want = [None] * n_decks  # (track, mask) each deck is playing; written by the audio thread
+        self.ready = [None] * n_decks  # (track, mask, submix) for each deck; written by the builder
+        self._entries = OrderedDict()  # (id(track), mask) -> (weakref to track, submix)
+        self._oversize = {}  # same keys, for submixes bigger than the whole budget
+        self._stop = threading.Event()
+        self._thread = None
+        self.builds = 0
+        self.hits = 0  # wanted submixes that were still cached
+        self.evictions = 0
+        self.skipped = 0  # too big for the budget on their own
+        self.build_ms = 0.0  # last build
+
+    def get(self, deck, track, mask):
+        """The submix to read for deck's track under mask, or None to mix stems. Audio thread only."""
+        ready = self.ready[deck]
+        if ready is not None and ready[0] is track and ready[1] == mask:
+            return ready[2]
+        want = self.want[deck]
+        if mask > 0 and self.budget and (want is None or want[0] is not track or want[1] != mask):
+            self.want[deck] = (track, mask)
+        return None
+
+    def start(self):
+        if self._thread is None and self.budget:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="submix", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(INTERVAL):
+            for deck, want in enumerate(self.want):
+                if want is None:
+                    continue
+                ready = self.ready[deck]
+                if ready is not None and ready[0] is want[0] and ready[1] == want[1]:
+                    continue
+                if ready is not None and ready[0] is not want[0]:
+                    self.ready[deck] = None  # the deck moved on to another track; let the old one go
+                submix = self._lookup(*want)
+                if submix is not None:
+                    self.ready[deck] = (want[0], want[1], submix)
+                    self._evict()
+
+    def _lookup(self, track, mask):
+        key = (id(track), mask)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0]() is track:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if not track.done:
+            return None  # still decoding; asked again next pass
+        if track.length * 2 * 4 > self.budget:
+            ref = self._oversize.get(key)
+            if ref is None or ref() is not track:
+                self._oversize[key] = weakref.ref(track)
+                self.skipped += 1
+            return None
+        start = perf_counter()
+        submix = render(track, mask)
+        self.build_ms = 1000.0 * (perf_counter() - start)
+        self.builds += 1
+        self._entries[key] = (weakref.ref(track), submix)
+        return submix
+
+    def _evict(self):
+        in_use = {id(r[2]) for r in self.ready if r is not None}
+        for key, (ref, submix) in list(self._entries.items()):
+            if ref() is None and id(submix) not in in_use:
+                del self._entries[key]  # its track is gone
+        resident = self.nbytes
+        for key, (ref, submix) in list(self._entries.items()):
+            if resident <= self.budget:
+                break
+            if id(submix) in in_use:
+                continue
+            del self._entries[key]
+            resident -= submix.nbytes
+            self.evictions += 1
+
+    @property
+    def nbytes(self):
+        return sum(submix.nbytes for _, submix in self._entries.values())
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "budget": self.budget,
+            "builds": self.builds,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+            "build_ms": self.build_ms,
+        }
@@ -0,0 +1,220 @@
+import os
+import threading
+import math
+import soundfile as sf
+import numpy as np
+from playback import cache
+
+SONGS_DIR = "songs"
+STEMS = ["bass", "drums", "other", "vocals"]
+CHUNK_FRAMES = 1 << 16  # ~1.5 s at 44.1 kHz per decode step
+
+# Stem storage modes: dtype name -> factor that turns a stored value back into float audio.
+# int16/float16 halve memory; the mixer converts only the samples it gathers.
+STORAGE_SCALE = {"float32": 1.0, "float16": 1.0, "int16": 1.0 / 32767}
+
+
+def stem_path(song, stem):
+    return os.path.join(SONGS_DIR, song, f"{stem}.mp3")
+
+
+def encode(samples, dtype):
+    """Convert float audio to a storage dtype (rounding and clipping for int16)."""
+    dtype = np.dtype(dtype)
+    if dtype.kind == "i":
+        info = np.iinfo(dtype)
+        return np.clip(np.rint(samples * info.max), info.min, info.max).astype(dtype)
+    return samples.astype(dtype, copy=False)
+
+
+def _convert_rate(block, positions):
+    """Linearly interpolate a (frames, channels) block at fractional positions."""
+    grid = np.arange(len(block))
+    out = np.empty((len(positions), block.shape[1]), dtype=np.float32)
+    for ch in range(block.shape[1]):
+        out[:, ch] = np.interp(positions, grid, block[:, ch])
+    return out
+
+
+class Track:
+    """The stems of one song, possibly still being decoded.
+
+    All stems live in one contiguous (n_stems, frames, 2) block, zero-padded
+    to the longest stem, so the mixer can gather every stem with a single
+    index array. The block is float32 by default or a compact STORAGE_SCALE
+    dtype; multiply stored values by scale to get float audio. A streaming track preallocates the block
+    with np.zeros (pages are only committed as they are written) and fills
+    it from one decoder thread per stem. Decoded spans are kept per stem as
+    an immutable tuple of (start, stop) ranges that the decoder replaces
+    wholesale, so the audio thread can check them without a lock.
+    """
+
+    def __init__(self, song, sr, data, frames=None, ranges=None, owner=None):
+        self.song = song
+        self.sr = sr
+        self.data = data
+        self._owner = owner  # whatever data's memory belongs to, if not data itself (see _allocate)
+        self.scale = STORAGE_SCALE[data.dtype.name]
+        self.stems = list(data)  # per-stem (frames, 2) views
+        self.length = data.shape[1]
+        # Real (unpadded) length of each stem; past it a stem is just silence
+        self._frames = list(frames) if frames is not None else [self.length] * len(data)
+        # Fully-loaded unless told otherwise
+        self._ranges = ranges if ranges is not None else [((0, n),) for n in self._frames]
+        self._want = None  # seek target the decoders should jump to
+        self._closed = False
+        self._threads = []
+        self.paths = None  # source files, when loaded from songs/
+        self._lock = threading.Lock()  # decoder threads only: who writes the cache entry
+        self._store_when_done = False
+        self.waveform = None  # overview peaks, built once (see SongSelector)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    @classmethod
+    def open(cls, song, sr, use_cache=True, storage="float32"):
+        """Load song's stems at sample rate sr and return immediately.
+
+        A song already in the PCM cache is memory-mapped as one block;
+        otherwise the stems are decoded in parallel (converting the sample
+        rate if the file's differs) and the block is written to the cache
+        once complete. storage picks the sample dtype (see STORAGE_SCALE).
+        """
+        paths = [stem_path(song, stem) for stem in STEMS]
+        cached = cache.load(paths, sr, dtype=storage) if use_cache else None
+        if cached is not None:
+            track = cls(song, sr, cached)
+            track.paths = paths
+            return track
+
+        infos = [sf.info(path) for path in paths]
+        frames = [math.ceil(info.frames * sr / info.samplerate) for info in infos]
+        data, owner = cls._allocate((len(paths), max(frames), 2), storage)
+        track = cls(song, sr, data, frames=frames, ranges=[() for _ in paths], owner=owner)
+        track.paths = paths
+        track._store_when_done = use_cache
+        for i, (path, info) in enumerate(zip(paths, infos)):
+            t = threading.Thread(target=track._decode, args=(i, path, info.frames, info.samplerate), daemon=True)
+            track._threads.append(t)
+            t.start()
+        return track
+
+    @classmethod
+    def _allocate(cls, shape, dtype):
+        """Zeroed block for a streaming track to decode into, and its owner (None for a plain array)."""
+        return np.zeros(shape, dtype=dtype), None
+
+    # -- readiness --------------------------------------------------------
+
+    def _covered(self, i, start, stop):
+        stop = min(stop, self._frames[i])
+        if start >= stop:
+            return True
+        for a, b in self._ranges[i]:
+            if a <= start and stop <= b:
+                return True
+        return False
+
+    def available(self, start, stop):
+        """True if every stem is decoded over [start, stop). Safe from the audio thread."""
+        for i in range(len(self._frames)):
+            if not self._covered(i, start, stop):
+                return False
+        return True
+
+    def request(self, pos):
+        """Ask the decoders to jump to pos next (e.g. after a seek past the frontier)."""
+        self._want = int(pos)
+
+    @property
+    def done(self):
+        return all(self._covered(i, 0, n) for i, n in enumerate(self._frames))
+
+    @property
+    def progress(self):
+        """Fraction of all stem frames decoded so far, in [0, 1]."""
+        total = sum(self._frames)
+        if not total:
+            return 1.0
+        decoded = sum(b - a for ranges in self._ranges for a, b in ranges)
+        return decoded / total
+
+    def wait(self):
+        for t in self._threads:
+            t.join()
+
+    def close(self):
+        """Stop any running decoders. The arrays stay valid."""
+        self._closed = True
+
+    # -- decoder threads --------------------------------------------------
+
+    def _next_start(self, i, cursor):
+        """Where stem i should decode next: the seek target, else the first gap after cursor."""
+        want = self._want
+        if want is not None and not self._covered(i, want, want + 1):
+            return want
+        n = self._frames[i]
+        ranges = self._ranges[i]
+        for origin in (cursor, 0):
+            pos = origin
+            for a, b in ranges:
+                if b <= pos:
+                    continue
+                if a > pos:
+                    break
+                pos = b
+            if pos < n:
+                return pos
+        return None
+
+    def _mark(self, i, start, stop):
+        merged = []
+        for a, b in sorted(self._ranges[i] + ((start, stop),)):
+            if merged and a <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+            else:
+                merged.append((a, b))
+        self._ranges[i] = tuple(merged)
+
+    def _decode(self, i, path, src_frames, src_sr):
+        stem = self.data[i]
+        n = self._frames[i]
+        step = src_sr / self.sr  # source frames per output frame
+        with sf.SoundFile(path) as f:
+            cursor = 0
+            while not self._closed:
+                start = self._next_start(i, cursor)
+                if start is None:
+                    break
+                stop = min(start + CHUNK_FRAMES, n)
+                if step == 1.0:
+                    src_start, src_stop = start, min(stop, src_frames)
+                else:
+                    # Source span covering output frames [start, stop), plus one frame for interpolation
+                    src_start = int(start * step)
+                    src_stop = min(int((stop - 1) * step) + 2, src_frames)
+                if src_start != f.tell():
+                    f.seek(src_start)
+                block = f.read(max(0, src_stop - src_start), dtype='float32', always_2d=True)
+                if step == 1.0:
+                    got = len(block)
+                else:
+                    got = min(stop - start, int((src_start + len(block) - 1) / step) - start + 1)
+                    if got > 0:
+                        block = _convert_rate(block, np.arange(start, start + got) * step - src_start)
+                if got <= 0:
+                    # Header over-reported the length; the tail stays silent
+                    self._mark(i, start, n)
+                    cursor = n
+                    continue
+                stem[start:start + got] = encode(block[:, :2], stem.dtype)  # mono (got, 1) broadcasts to both channels
+                self._mark(i, start, start + got)
+                cursor = start + got
+        # The last decoder to finish writes the whole block to the cache
+        with self._lock:
+            if self._store_when_done and not self._closed and self.done:
+                cache.store(self.paths, self.sr, self.data)
+                self._store_when_done = False
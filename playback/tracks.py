@@ -0,0 +1,98 @@
+"""
+In-memory cache of open tracks, shared by every deck.
+
+Entries are reference counted: each deck holding a song owns one
+reference, so the same song on two decks is decoded and stored once.
+Released tracks stay resident, most recently used last, until the total
+size passes the memory budget; then the least recently used unreferenced
+tracks are closed and dropped. A referenced track (one a deck has loaded,
+playing or not) is never evicted, even if that leaves the cache over
+budget.
+"""
+import threading
+from collections import OrderedDict
+from playback.track import Track
+
+DEFAULT_BUDGET = 2 << 30  # bytes
+
+
+class TrackCache:
+    def __init__(self, budget=DEFAULT_BUDGET, track_class=Track):
+        """track_class: opens songs on a miss, e.g. shared.SharedTrack for a separate engine process."""
+        self.budget = budget
+        self.track_class = track_class
+        self._entries = OrderedDict()  # (song, sr, storage) -> [track, refs]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, song, sr, storage="float32"):
+        """Return the song's track, opening it on a miss. Call release() when the deck lets go."""
+        key = (song, sr, storage)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        # Open outside the lock: a cache miss may have to start decoding
+        track = self.track_class.open(song, sr, storage=storage)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                # Another thread opened it meanwhile; keep theirs
+                track.close()
+                entry[1] += 1
+                self.hits += 1
+                return entry[0]
+            self._entries[key] = [track, 1]
+            self.misses += 1
+            self._evict()
+        return track
+
+    def release(self, track):
+        """Drop one reference to track. Tracks not from this cache are just closed."""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if entry[0] is track:
+                    entry[1] = max(0, entry[1] - 1)
+                    self._entries.move_to_end(key)
+                    self._evict()
+                    return
+        track.close()
+
+    def _evict(self):
+        resident = sum(track.nbytes for track, _ in self._entries.values())
+        for key in list(self._entries):
+            if resident <= self.budget:
+                break
+            track, refs = self._entries[key]
+            if refs:
+                continue
+            del self._entries[key]
+            track.close()
+            resident -= track.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Close and drop every unreferenced track."""
+        with self._lock:
+            for key, (track, refs) in list(self._entries.items()):
+                if not refs:
+                    del self._entries[key]
+                    track.close()
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(track.nbytes for track, _ in entries),
+            "pinned_bytes": sum(track.nbytes for track, refs in entries if refs),
+            "budget": self.budget,
+        }
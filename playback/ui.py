@@ -1,6 +1,7 @@
 import cv2
 import math
 import numpy as np
+from playback.meters import FLOOR_DB, to_db
 
 def draw_rounded_rect(img, pt1, pt2, color, thickness, r, d=0):
     """Draw a rectangle with rounded corners."""
@@ -568,6 +569,10 @@ class Waveform:
         draw_rounded_rect(frame, (self.x, self.y), (self.x + self.width, self.y + self.height), (180, 180, 180), 2, 8)
         draw_rounded_rect(frame, (self.x + 2, self.y + 2), (self.x + self.width - 2, self.y + self.height - 2), (20, 20, 20), -1, 6)
 
+        loading = self.selector.loading(self.side)
+        if loading is not None:
+            self.draw_loading(frame, *loading)
+
         waveform = self.selector.waveforms[self.side]
         if not len(waveform):
             return frame
@@ -599,3 +604,123 @@ class Waveform:
 
         return frame
 
+    def draw_loading(self, frame, song, progress):
+        # Thin progress bar along the bottom edge while the next song decodes in the background
+        bar_y = self.y + self.height - 6
+        bar_w = int((self.width - 10) * progress)
+        cv2.line(frame, (self.x + 5, bar_y), (self.x + self.width - 5, bar_y), (60, 60, 60), 3)
+        cv2.line(frame, (self.x + 5, bar_y), (self.x + 5 + bar_w, bar_y), (0, 200, 255), 3)
+        cv2.putText(frame, f"{song[:24]} {int(progress * 100)}%", (self.x + 8, self.y + 14),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 200, 255), 1)
+
+
+class LevelMeter:
+    """Vertical post-fader meter for one deck (or the master with side=None): RMS bar, peak line, held peak."""
+    DB_RANGE = 48.0  # bottom of the scale is -48 dBFS
+    HOLD_FRAMES = 30
+    HOLD_FALL_DB = 1.0  # per frame once the hold runs out
+
+    def __init__(self, x, y, width, height, selector, side=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.selector = selector
+        self.side = side
+        self.held = -self.DB_RANGE
+        self.hold_left = 0
+
+    def _fraction(self, db):
+        return max(0.0, min(1.0, 1.0 + db / self.DB_RANGE))
+
+    def _color(self, db):
+        if db > -3:
+            return (40, 40, 235)  # red
+        if db > -12:
+            return (40, 210, 235)  # yellow
+        return (60, 200, 60)
+
+    def draw(self, frame):
+        peak, rms = self.selector.get_levels(self.side)
+        peak_db, rms_db = to_db(peak), to_db(rms)
+        if peak_db >= self.held:
+            self.held, self.hold_left = peak_db, self.HOLD_FRAMES
+        elif self.hold_left:
+            self.hold_left -= 1
+        else:
+            self.held = max(-self.DB_RANGE, self.held - self.HOLD_FALL_DB)
+
+        draw_rounded_rect(frame, (self.x, self.y), (self.x + self.width, self.y + self.height), (180, 180, 180), 2, 4)
+        cv2.rectangle(frame, (self.x + 2, self.y + 2), (self.x + self.width - 2, self.y + self.height - 2), (20, 20, 20), -1)
+        inner = self.height - 6
+        bottom = self.y + self.height - 3
+        x1, x2 = self.x + 4, self.x + self.width - 4
+
+        top = bottom - int(self._fraction(rms_db) * inner)
+        if top < bottom:
+            cv2.rectangle(frame, (x1, top), (x2, bottom), self._color(rms_db), -1)
+        peak_y = bottom - int(self._fraction(peak_db) * inner)
+        cv2.line(frame, (x1, peak_y), (x2, peak_y), (220, 220, 220), 1)
+        held_y = bottom - int(self._fraction(self.held) * inner)
+        cv2.line(frame, (x1, held_y), (x2, held_y), self._color(self.held), 2)
+        return frame
+
+
+class Spectrum:
+    """Master output spectrum as log-spaced bars, from the selector's analyzer thread."""
+
+    def __init__(self, x, y, width, height, selector, color=(235, 99, 37)):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.selector = selector
+        self.color = color
+
+    def draw(self, frame):
+        draw_rounded_rect(frame, (self.x, self.y), (self.x + self.width, self.y + self.height), (180, 180, 180), 2, 8)
+        draw_rounded_rect(frame, (self.x + 2, self.y + 2), (self.x + self.width - 2, self.y + self.height - 2), (20, 20, 20), -1, 6)
+
+        bands = self.selector.get_spectrum()
+        inner_w = self.width - 10
+        inner_h = self.height - 10
+        bar_w = inner_w / len(bands)
+        bottom = self.y + self.height - 5
+        for i, db in enumerate(bands):
+            h = int((1.0 - db / FLOOR_DB) * inner_h)
+            if h <= 0:
+                continue
+            bx1 = self.x + 5 + int(i * bar_w)
+            bx2 = self.x + 5 + int((i + 1) * bar_w) - 1
+            cv2.rectangle(frame, (bx1, bottom - h), (max(bx1, bx2), bottom), self.color, -1)
+        return frame
+
+
+class AudioStatsOverlay:
+    """Text readout of the audio callback's health (selector.get_audio_stats()), plus a load bar."""
+
+    def __init__(self, x, y, selector, width=330):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.selector = selector
+
+    def draw(self, frame):
+        stats = self.selector.get_audio_stats()
+        lines = [
+            f"xruns {stats['xruns']}  (under {stats['underflows']} / over {stats['overflows']})  overruns {stats['overruns']}",
+            f"block {stats['block_frames']} ({stats['block_ms']:.1f} ms)  load {stats['load']:.0%}  max {stats['max_load']:.0%}",
+            f"callback ms  p50 {stats['p50_ms']:.2f}  p95 {stats['p95_ms']:.2f}  p99 {stats['p99_ms']:.2f}  max {stats['max_ms']:.2f}",
+        ]
+        height = 18 * len(lines) + 20
+        panel = frame[self.y:self.y + height, self.x:self.x + self.width]
+        panel[:] = panel // 3  # darken what's behind the text
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (self.x + 6, self.y + 16 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.38,
+                        (40, 40, 235) if i == 0 and stats["xruns"] else (220, 220, 220), 1)
+        bar_y = self.y + height - 8
+        bar_w = int(min(1.0, stats["load"]) * (self.width - 12))
+        color = (40, 40, 235) if stats["load"] > 0.8 else (60, 200, 60)
+        cv2.line(frame, (self.x + 6, bar_y), (self.x + self.width - 6, bar_y), (60, 60, 60), 4)
+        cv2.line(frame, (self.x + 6, bar_y), (self.x + 6 + bar_w, bar_y), color, 4)
+        return frame
@@ -0,0 +1,71 @@
+"""Recorder: dropped blocks leave silence where they were, not at the end of the file."""
+import threading
+from types import SimpleNamespace
+import numpy as np
+import soundfile as sf
+from playback import recorder
+
+SR = 1000
+BLOCK = 100
+
+
+class _Gate:
+    """Stands in for recorder.time: the writer thread parks at each sleep until let through once."""
+
+    def __init__(self):
+        self.parked = threading.Semaphore(0)
+        self.go = threading.Semaphore(0)
+        self.open = False
+
+    def sleep(self, seconds):
+        if not self.open:
+            self.parked.release()
+            self.go.acquire()
+
+    def drain(self):
+        """Let the writer drain the ring once and wait until it's parked again."""
+        self.go.release()
+        self.parked.acquire()
+
+
+class _File(sf.SoundFile):
+    """SoundFile that runs on_write after each write, to play blocks while the writer is mid-drain."""
+    on_write = None
+
+    def write(self, data):
+        super().write(data)
+        if _File.on_write is not None:
+            _File.on_write()
+
+
+def test_dropped_blocks_are_padded_in_place(tmp_path, monkeypatch):
+    gate = _Gate()
+    monkeypatch.setattr(recorder, "time", SimpleNamespace(sleep=gate.sleep))
+    monkeypatch.setattr(recorder, "sf", SimpleNamespace(SoundFile=_File))
+    monkeypatch.setattr(recorder, "CHUNK_SECONDS", 5 * BLOCK / SR)
+    rec = recorder.Recorder(SR, ring_seconds=10 * BLOCK / SR)  # room for 10 blocks, drained 5 at a time
+    path = str(tmp_path / "out.wav")
+    rec.start(path, subtype="FLOAT")
+    gate.parked.acquire()  # writer is stalled
+    clock = [0]
+
+    def play(blocks):
+        for i in blocks:
+            rec.capture(np.full((BLOCK, 2), i, dtype=np.float32), clock[0])
+            clock[0] += BLOCK
+
+    # 11-15 don't fit; 16-20 arrive once the writer has made room, before it reaches the drop
+    play(range(1, 16))
+    pending = [range(16, 21)]
+    monkeypatch.setattr(_File, "on_write", lambda: play(pending.pop()) if pending else None)
+    gate.drain()
+    play(range(21, 24))
+    gate.open = True
+    gate.go.release()
+    stats = rec.stop(running=False)
+
+    assert stats["dropped_frames"] == 5 * BLOCK
+    audio, _ = sf.read(path, dtype="float32")
+    assert len(audio) == clock[0]  # the file spans the session exactly
+    got = audio[::BLOCK, 0].astype(int).tolist()
+    assert got == [0 if 11 <= i <= 15 else i for i in range(1, 24)]
@@ -0,0 +1,91 @@
+"""SongSelector driven headless on the null backend, stepped block by block."""
+import numpy as np
+import pytest
+from playback.selector import SongSelector
+from playback.track import Track, STEMS
+from playback.tracks import TrackCache
+
+SR = 44100
+BLOCK = 512
+
+
+class _NoiseTrack(Track):
+    """Opens any song name as 10 s of noise stems instead of decoding songs/."""
+
+    @classmethod
+    def open(cls, song, sr, use_cache=True, storage="float32"):
+        rng = np.random.default_rng(0)
+        return cls(song, sr, rng.uniform(-0.5, 0.5, (len(STEMS), 10 * sr, 2)).astype(np.float32))
+
+
+def _selector():
+    return SongSelector(SR, backend="null", backend_options={"blocksize": BLOCK, "speed": 0},
+                        track_cache=TrackCache(track_class=_NoiseTrack), submix_budget=0)
+
+
+def test_reselecting_the_loaded_song_resets_the_deck():
+    s = _selector()
+    try:
+        s.select("left", "noise")
+        s.play("left", "now")
+        s.stream.step(100)
+        assert s._position[0] == 100 * BLOCK
+        s.select("left", "noise")  # the cache hands back the very same Track
+        assert s.tracks["left"] is s._tracks[0]
+        s.stream.step()
+        assert s._position[0] == 0.0
+        assert not s._playing[0]
+        s.play("left", "now")
+        s.stream.step(2)
+        assert s._position[0] == 2 * BLOCK
+    finally:
+        s.close()
+
+
+def _with_bpm(s, bpms):
+    for side, bpm in bpms.items():
+        s.bpm[side] = bpm
+
+
+def test_resampled_sync_undoes_a_pending_folded_ratio():
+    s = _selector()
+    try:
+        s.select("left", "noise")
+        s.select("right", "noise-b")
+        _with_bpm(s, {"left": 120.0, "right": 130.0})
+        s.cue_point["left"] = 1000.0
+        s.apply_bpm_sync()  # folded: queues SET_SYNC 0.96 for the left deck
+        s.apply_bpm_sync(resample=True, quality="fast")  # before any block has taken it
+        s.stream.step()
+        assert s._sync_ratio[0] == 1.0
+        assert s.cue_point["left"] == 1000.0 * 120.0 / 125.0
+    finally:
+        s.close()
+
+
+def test_resampled_sync_at_the_common_tempo_renders_nothing():
+    s = _selector()
+    try:
+        s.select("left", "noise")
+        s.select("right", "noise-b")
+        _with_bpm(s, {"left": 125.0, "right": 125.0})
+        tracks = dict(s.tracks)
+        s.apply_bpm_sync(resample=True, quality="fast")
+        assert s.tracks == tracks
+    finally:
+        s.close()
+
+
+def test_loops_only_take_the_supported_beat_counts():
+    s = _selector()
+    try:
+        s.select("left", "noise")
+        s.loop("left", 4)
+        assert s.loops["left"][2] == 4
+        for beats in (3, 16, 0.5):
+            with pytest.raises(ValueError):
+                s.loop("left", beats)
+            with pytest.raises(ValueError):
+                s.loop_roll("left", beats)
+    finally:
+        s.close()
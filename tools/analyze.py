@@ -0,0 +1,51 @@
+"""
+Detect BPM and beat grids for the song library (see playback/analysis.py).
+
+Usage (from the repo root):
+  python -m tools.analyze [song ...] [--force] [--workers N]
+
+Walks songs/ (or just the songs given), skips any whose analysis.json is
+up to date with its drums stem, and analyzes the rest across a process pool.
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from playback import analysis
+from playback.track import stem_path
+from playback.library import list_songs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect BPM and beat grids for songs/.")
+    parser.add_argument("songs", nargs="*", help="song folder names under songs/ (default: all)")
+    parser.add_argument("--force", action="store_true", help="re-analyze songs that are up to date")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    songs = [s for s in (args.songs or list_songs()) if os.path.isfile(stem_path(s, "drums"))]
+    todo = [s for s in songs if args.force or not analysis.is_current(s)]
+    print(f"{len(songs) - len(todo)} of {len(songs)} songs up to date, analyzing {len(todo)}")
+    if not todo:
+        return
+
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        jobs = {pool.submit(analysis.analyze, song): song for song in todo}
+        for job in as_completed(jobs):
+            song = jobs[job]
+            try:
+                info = job.result()
+            except (OSError, RuntimeError, ValueError) as e:
+                failed += 1
+                print(f"  {song}: failed ({e})")
+                continue
+            print(f"  {song}: {info['bpm']:7.2f} BPM, downbeat at {info['downbeat']:.3f} s, "
+                  f"{len(info['beats'])} beats")
+    print(f"Analyzed {len(todo) - failed} songs in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
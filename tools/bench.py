@@ -0,0 +1,363 @@
+"""
+Micro-benchmarks for the audio engine, on synthetic stems (no sound card or songs needed).
+
+Usage (from the repo root):
+  python -m tools.bench mix        Per-callback mixing cost, old per-stem loop vs. stacked kernel.
+  python -m tools.bench resample   Offline BPM-sync resampling: speed, peak memory and accuracy per quality.
+  python -m tools.bench storage    Memory and per-callback cost of float32 / float16 / int16 stem storage.
+  python -m tools.bench library    Library index: full and incremental build time, lookup latency.
+  python -m tools.bench graph      Mixer graph stages (filters, gain ramps, limiter) per block vs. the block budget.
+  python -m tools.bench stretch    Keylock (WSOLA time-stretch) vs. resampling playback: cost per block and latency.
+  python -m tools.bench interp     Realtime interpolation qualities: ns per output sample, accuracy and aliasing.
+  python -m tools.bench submix     Reading a pre-mixed stem set vs. every stem: cost per block, build time, memory.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+import tracemalloc
+import numpy as np
+import soundfile as sf
+from playback.mixer import MixScratch, Interpolator, INTERPOLATION, mix_stems
+from playback.graph import MixerGraph, HIGHPASS, LOWPASS, SIDE_A, SIDE_B, RAMP_FRAMES
+from playback import resample as offline
+from playback import stretch, submix
+from playback.library import Library
+from playback.track import Track, STEMS, STORAGE_SCALE, encode, stem_path
+
+SR = 44100
+BLOCK_SIZES = [64, 128, 256, 512, 1024, 2048, 4096]
+
+
+def synthetic_stems(seconds=360, n_stems=4, seed=0):
+    """(n_stems, frames, 2) float32 noise, the shape Track.data uses."""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((n_stems, int(seconds * SR), 2), dtype=np.float32) * 0.1)
+
+
+def time_per_call(fn, min_time=0.2):
+    """Median seconds per call of fn() over repeated batches."""
+    fn()
+    runs = []
+    deadline = time.perf_counter() + min_time
+    while time.perf_counter() < deadline or len(runs) < 5:
+        start = time.perf_counter()
+        for _ in range(10):
+            fn()
+        runs.append((time.perf_counter() - start) / 10)
+    return float(np.median(runs))
+
+
+def legacy_mix(stems, volumes, pos, rate, frames, outdata):
+    """The original per-stem _callback body, kept as the baseline."""
+    max_len = max(len(s) for s in stems)
+    read_positions = pos + np.arange(frames, dtype=np.float64) * rate
+    valid = read_positions < max_len
+    rp = read_positions[valid]
+    i0 = np.floor(rp).astype(np.int64)
+    t = (rp - i0).astype(np.float32)
+    n_valid = len(rp)
+    for i, stem_data in enumerate(stems):
+        vol = volumes[i]
+        if vol == 0.0:
+            continue
+        slen = len(stem_data)
+        mask = i0 < slen - 1
+        idx = np.minimum(i0[mask], slen - 2)
+        frac = t[mask]
+        samples = stem_data[idx] * (1 - frac[:, None]) + stem_data[idx + 1] * frac[:, None]
+        out_slice = outdata[:n_valid]
+        out_slice[mask] += samples * vol
+
+
+def legacy_resample(stem, new_len):
+    """The original per-channel np.interp _resample_stem, kept as the baseline."""
+    old_len = len(stem)
+    indices = np.linspace(0, old_len - 1, new_len)
+    out = np.empty((new_len, stem.shape[1]), dtype=stem.dtype)
+    for ch in range(stem.shape[1]):
+        out[:, ch] = np.interp(indices, np.arange(old_len), stem[:, ch])
+    return out
+
+
+def bench_mix(rate=1.03):
+    data = synthetic_stems()
+    stems = list(data)
+    gains = np.ones(len(data), dtype=np.float32)
+    scratch = MixScratch(n_stems=len(data))
+    pos = len(stems[0]) / 3
+
+    print(f"Mixing one deck of {len(data)} stems at rate {rate}  (us per callback, median)")
+    print(f"  {'block':>6}  {'legacy':>9}  {'stacked':>9}  {'speedup':>7}  {'budget':>9}")
+    for frames in BLOCK_SIZES:
+        out = np.zeros((frames, 2), dtype=np.float32)
+        old = time_per_call(lambda: legacy_mix(stems, gains, pos, rate, frames, out))
+        new = time_per_call(lambda: mix_stems(data, gains, pos, rate, frames, out, scratch))
+        budget = frames / SR
+        print(f"  {frames:6d}  {old * 1e6:9.1f}  {new * 1e6:9.1f}  {old / new:6.2f}x  {budget * 1e6:9.1f}")
+
+
+def _measure(fn):
+    """(seconds, peak traced bytes) for one call of fn."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def bench_resample(seconds=60, ratio=1.0322, tone=5000.0):
+    # A pure tone makes the exact resampled signal known, so error is measurable
+    frames = int(seconds * SR)
+    t = np.arange(frames) / SR
+    x = (0.5 * np.sin(2 * np.pi * tone * t)).astype(np.float32)
+    data = np.ascontiguousarray(np.broadcast_to(x[None, :, None], (4, frames, 2)))
+    new_len = int(frames * ratio)
+    step = (frames - 1) / (new_len - 1)
+    ideal = 0.5 * np.sin(2 * np.pi * tone * np.arange(new_len) * step / SR)
+    edge = 1000
+
+    def snr(y):
+        err = y[edge:-edge] - ideal[edge:-edge]
+        return 10 * np.log10(np.mean(ideal[edge:-edge] ** 2) / np.mean(err ** 2))
+
+    audio_s = seconds * 4
+    print(f"Resampling 4 stereo stems of {seconds} s by {ratio}  ({tone:.0f} Hz tone)")
+    print(f"  {'engine':>16}  {'time s':>7}  {'x realtime':>10}  {'peak MB':>8}  {'SNR dB':>7}")
+    elapsed, peak, out = _measure(lambda: [legacy_resample(stem, new_len) for stem in data])
+    print(f"  {'legacy linear':>16}  {elapsed:7.2f}  {audio_s / elapsed:10.1f}  {peak / 1e6:8.1f}  {snr(out[0][:, 0]):7.1f}")
+    for quality in offline.QUALITY:
+        elapsed, peak, out = _measure(lambda: offline.resample(data, new_len, quality))
+        print(f"  {'resample ' + quality:>16}  {elapsed:7.2f}  {audio_s / elapsed:10.1f}  {peak / 1e6:8.1f}  {snr(out[0, :, 0]):7.1f}")
+
+
+def bench_storage(rate=1.03, track_seconds=360):
+    data = synthetic_stems(seconds=60)
+    gains = np.ones(len(data), dtype=np.float32)
+    pos = data.shape[1] / 3
+    frames_per_deck = int(track_seconds * SR)
+    blocks = [128, 512, 2048]
+
+    print(f"Stem storage modes  (memory for 2 decks x 4 stereo stems of {track_seconds} s; us per callback)")
+    header = "".join(f"  {f'{b} frames':>11}" for b in blocks)
+    print(f"  {'mode':>8}  {'2 decks MB':>10}  {'SNR dB':>7}{header}")
+    for mode, scale in STORAGE_SCALE.items():
+        stored = encode(data, mode)
+        decoded = stored.astype(np.float32) * scale
+        err = decoded - data
+        snr = 10 * np.log10(np.mean(data ** 2) / max(np.mean(err ** 2), 1e-30))
+        deck_mb = 2 * 4 * frames_per_deck * 2 * stored.itemsize / 1e6
+        scratch = MixScratch(n_stems=len(data))
+        costs = ""
+        for frames in blocks:
+            out = np.zeros((frames, 2), dtype=np.float32)
+            cost = time_per_call(lambda: mix_stems(stored, gains, pos, rate, frames, out, scratch, scale))
+            costs += f"  {cost * 1e6:11.1f}"
+        snr_text = "exact" if mode == "float32" else f"{snr:.1f}"
+        print(f"  {mode:>8}  {deck_mb:10.0f}  {snr_text:>7}{costs}")
+
+
+def bench_library(n_songs=200, seconds=4, n_lookups=2000):
+    # A throwaway songs/ tree of short noise stems; the index cost per song is
+    # dominated by decoding, so short stems keep the build measurable.
+    root = tempfile.mkdtemp(prefix="library-bench-")
+    cwd = os.getcwd()
+    try:
+        os.chdir(root)
+        clip = synthetic_stems(seconds=seconds, n_stems=1)[0]
+        for i in range(n_songs):
+            song = f"song_{i:05d}"
+            os.makedirs(os.path.join("songs", song))
+            for stem in STEMS:
+                sf.write(stem_path(song, stem), clip, SR)
+            with open(os.path.join("songs", song, "bpm.txt"), "w") as f:
+                f.write(f"{100 + i % 60}\n")
+
+        print(f"Library index over {n_songs} songs of {len(STEMS)} x {seconds} s stems")
+        library = Library(os.path.join(".cache", "library.sqlite"))
+        start = time.perf_counter()
+        scanned, _ = library.update()
+        full = time.perf_counter() - start
+        print(f"  full build        {full:8.2f} s   ({scanned} songs, {full / scanned * 1e3:.1f} ms/song)")
+
+        start = time.perf_counter()
+        scanned, _ = library.update()
+        print(f"  unchanged rescan  {time.perf_counter() - start:8.3f} s   ({scanned} songs decoded)")
+
+        os.utime(stem_path("song_00000", "drums"))
+        start = time.perf_counter()
+        scanned, _ = library.update()
+        print(f"  one song touched  {time.perf_counter() - start:8.3f} s   ({scanned} songs decoded)")
+
+        listing = time_per_call(library.songs)
+        names = [f"song_{i:05d}" for i in np.random.default_rng(0).integers(0, n_songs, n_lookups)]
+        it = iter(names * 1000)
+        lookup = time_per_call(lambda: library.get(next(it)))
+        print(f"  list all songs    {listing * 1e3:8.3f} ms")
+        print(f"  get one + wave    {lookup * 1e6:8.1f} us")
+        library.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_graph(n_decks=2):
+    graph = MixerGraph(SR, [SIDE_A, SIDE_B] * (n_decks // 2))
+    for f in graph.filters:
+        f.set_cutoff(HIGHPASS, 120.0)
+        f.set_cutoff(LOWPASS, 8000.0)
+    rng = np.random.default_rng(0)
+
+    print(f"Mixer graph, {n_decks} decks  (us per callback, median; filters on, gains moving)")
+    print(f"  {'block':>6}  {'filters':>9}  {'gains':>9}  {'master':>9}  {'total':>9}  {'budget':>9}  {'load':>6}")
+    for frames in BLOCK_SIZES:
+        graph.ensure(frames)
+        blocks = [rng.standard_normal((frames, 2)).astype(np.float32) for _ in range(n_decks)]
+        out = np.empty((frames, 2), dtype=np.float32)
+        volumes = iter(np.tile([0.5, 0.9], 1 << 20))
+
+        def filters():
+            for deck, block in enumerate(blocks):
+                graph.filters[deck].process(block)
+
+        def gains():
+            for deck, block in enumerate(blocks):
+                target = next(volumes)
+                step = (target - graph.gain[deck]) / RAMP_FRAMES
+                graph.gain[deck] = graph._ramp_gain(block, graph.gain[deck], target, step)
+
+        def master():
+            np.add(blocks[0], blocks[1 % n_decks], out=out)
+            graph.master(out)
+
+        costs = [time_per_call(fn) for fn in (filters, gains, master)]
+        total = sum(costs)
+        budget = frames / SR
+        print(f"  {frames:6d}  " + "  ".join(f"{c * 1e6:9.1f}" for c in costs)
+              + f"  {total * 1e6:9.1f}  {budget * 1e6:9.1f}  {total / budget:5.1%}")
+
+
+def bench_stretch(rate=1.06):
+    print(f"Deck playback at rate {rate}: resampling (pitch follows tempo) vs. keylock  (us per callback, median)")
+    print(f"  {'stems':>5}  {'block':>6}  {'resample':>9}  {'keylock':>9}  {'budget':>9}  {'keylock load':>12}")
+    for n_stems in (4, 8):
+        data = synthetic_stems(seconds=60, n_stems=n_stems)
+        gains = np.ones(n_stems, dtype=np.float32)
+        scratch = MixScratch(n_stems=n_stems)
+        for frames in BLOCK_SIZES:
+            out = np.zeros((frames, 2), dtype=np.float32)
+            start, end = data.shape[1] / 4, data.shape[1] * 3 / 4  # keep reading real audio
+            pos = [start]
+
+            def resampled():
+                mix_stems(data, gains, pos[0], rate, frames, out, scratch)
+                pos[0] = pos[0] + frames * rate if pos[0] < end else start
+
+            stretcher = stretch.Stretcher()
+            stretcher.reset(start)
+
+            def keylocked():
+                stretcher.process(data, gains, rate, frames, out, scratch)
+                if stretcher.expected > end:
+                    stretcher.reset(start)
+
+            old = time_per_call(resampled)
+            new = time_per_call(keylocked)
+            budget = frames / SR
+            print(f"  {n_stems:5d}  {frames:6d}  {old * 1e6:9.1f}  {new * 1e6:9.1f}  {budget * 1e6:9.1f}  {new / budget:12.1%}")
+    print(f"  added latency: resampling 0 ms, keylock {stretch.LATENCY / SR * 1e3:.1f} ms "
+          f"(+ up to {stretch.HOP / SR * 1e3:.1f} ms of buffered output)")
+
+
+def _tone_stems(freq, seconds=4, n_stems=4):
+    t = np.arange(int(seconds * SR)) / SR
+    x = (0.2 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.ascontiguousarray(np.broadcast_to(x[None, :, None], (n_stems, len(x), 2)))
+
+
+def _read(data, rate, frames, interp):
+    scratch = MixScratch(n_stems=len(data), max_frames=frames)
+    out = np.zeros((frames, 2), dtype=np.float32)
+    mix_stems(data, np.full(len(data), 0.25, dtype=np.float32), 1000.3, rate, frames, out, scratch, interp=interp)
+    return out[:, 0]
+
+
+def bench_interp(frames=512, n_stems=4):
+    # Accuracy: a 3 kHz tone read at 1.37x against the exact resampled tone.
+    # Aliasing: a 15 kHz tone read at 1.9x lands above Nyquist; ideally it's removed.
+    accurate, alias = _tone_stems(3000.0), _tone_stems(15000.0)
+    n = 8192
+    ideal = 0.2 * np.sin(2 * np.pi * 3000.0 * (1000.3 + np.arange(n) * 1.37) / SR)
+    data = synthetic_stems(seconds=30, n_stems=n_stems)
+    gains = np.ones(n_stems, dtype=np.float32)
+    scratch = MixScratch(n_stems=n_stems)
+    out = np.zeros((frames, 2), dtype=np.float32)
+
+    print(f"Realtime interpolation, {n_stems} stems, {frames}-frame blocks at rate 1.9")
+    print(f"  {'quality':>8}  {'taps':>4}  {'us/block':>9}  {'ns/sample':>9}  {'SNR dB':>7}  {'alias dB':>8}")
+    for quality, (taps, _) in INTERPOLATION.items():
+        interp = None if quality == "linear" else Interpolator(quality)
+        pos = [data.shape[1] / 4]
+
+        def block():
+            mix_stems(data, gains, pos[0], 1.9, frames, out, scratch, interp=interp)
+            pos[0] = pos[0] + frames * 1.9 if pos[0] < data.shape[1] / 2 else data.shape[1] / 4
+
+        cost = time_per_call(block)
+        err = _read(accurate, 1.37, n, interp) - ideal
+        snr = 10 * np.log10(np.mean(ideal ** 2) / np.mean(err[64:-64] ** 2))
+        aliased = _read(alias, 1.9, n, interp)[64:-64]
+        alias_db = 20 * np.log10(max(np.sqrt(np.mean(aliased ** 2)) / (0.2 / np.sqrt(2)), 1e-10))
+        print(f"  {quality:>8}  {taps:4d}  {cost * 1e6:9.1f}  {cost / frames * 1e9:9.1f}  {snr:7.1f}  {alias_db:8.1f}")
+
+
+def bench_submix(rate=1.03, seconds=60):
+    track = Track("bench", SR, synthetic_stems(seconds=seconds))
+    start = time.perf_counter()
+    mixed = submix.render(track, 0b1111)
+    build = time.perf_counter() - start
+    gains, unity = np.ones(len(track.data), dtype=np.float32), np.ones(1, dtype=np.float32)
+    scratch = MixScratch(n_stems=len(track.data))
+
+    print(f"One deck of {len(track.data)} stems at rate {rate}: every stem vs. the all-stems submix  (us per callback, median)")
+    print(f"  submix build {build * 1e3:.0f} ms for {seconds} s, {mixed.nbytes / seconds * 60 / 1e6:.1f} MB per minute of track")
+    print(f"  {'interp':>7}  {'block':>6}  {'stems':>9}  {'submix':>9}  {'speedup':>7}  {'budget':>9}")
+    for quality in ("linear", "sinc8"):
+        interp = None if quality == "linear" else Interpolator(quality)
+        for frames in BLOCK_SIZES:
+            out = np.zeros((frames, 2), dtype=np.float32)
+            pos = track.length / 3
+            old = time_per_call(lambda: mix_stems(track.data, gains, pos, rate, frames, out, scratch, interp=interp))
+            new = time_per_call(lambda: mix_stems(mixed, unity, pos, rate, frames, out, scratch, interp=interp))
+            print(f"  {quality:>7}  {frames:6d}  {old * 1e6:9.1f}  {new * 1e6:9.1f}  {old / new:6.2f}x  {frames / SR * 1e6:9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audio engine micro-benchmarks.")
+    parser.add_argument("case", choices=["mix", "resample", "storage", "library", "graph", "stretch", "interp",
+                                         "submix"])
+    args = parser.parse_args(argv)
+    if args.case == "mix":
+        bench_mix()
+    elif args.case == "resample":
+        bench_resample()
+    elif args.case == "storage":
+        bench_storage()
+    elif args.case == "library":
+        bench_library()
+    elif args.case == "graph":
+        bench_graph()
+    elif args.case == "stretch":
+        bench_stretch()
+    elif args.case == "interp":
+        bench_interp()
+    elif args.case == "submix":
+        bench_submix()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Benchmark suite for the mixing engine, with machine-readable results for comparing commits.
+
+Drives a real SongSelector on the "null" output backend (no sound card) with
+synthetic stems, so every number comes from the same code paths the app
+runs: the audio callback across block sizes, rates and stem mute patterns,
+and select / apply_bpm_sync / waveform building across track lengths.
+
+Usage (from the repo root):
+  python -m tools.benchsuite                              Run everything and print a table.
+  python -m tools.benchsuite --quick -o results.json      Fewer sizes and shorter runs; save JSON.
+  python -m tools.benchsuite --case callback waveform     Only some cases.
+  python -m tools.benchsuite --compare base.json new.json Ratio of every result new/base;
+                                                          exit status 1 if any is slower by more than --threshold.
+  python -m tools.benchsuite -o new.json --compare base.json   Run, save, then compare against base.json.
+
+Every result is {"case", "params", "seconds", "metrics"}: seconds is the
+median time of one operation (one audio block for the callback case) and
+is what --compare looks at; metrics holds the rest.
+"""
+import sys
+import json
+import time
+import zlib
+import platform
+import argparse
+import subprocess
+import numpy as np
+from playback.selector import SongSelector
+from playback.stats import CallbackStats
+from playback.track import Track, STEMS, encode
+from playback.tracks import TrackCache
+from tools.bench import SR, BLOCK_SIZES, synthetic_stems, time_per_call
+
+RATES = (0.5, 1.0, 1.37, 2.0)
+# Per-stem volumes in STEMS order (bass, drums, other, vocals)
+MUTES = {
+    "all": (1, 1, 1, 1),
+    "rhythm": (1, 1, 0, 0),
+    "vocals": (0, 0, 0, 1),
+    "muted": (0, 0, 0, 0),
+}
+LENGTHS = (30, 90, 180)  # track lengths in seconds for select, bpm_sync and waveform
+CALLBACK_SECONDS = 60  # the callback case's tracks; long enough to never reach the end
+CASES = ("callback", "select", "bpm_sync", "waveform")
+THRESHOLD = 0.10
+
+
+class SyntheticTrack(Track):
+    """Opens "synth-<seconds>[-<tag>]" as that many seconds of noise stems instead of decoding songs/."""
+
+    @classmethod
+    def open(cls, song, sr, use_cache=True, storage="float32"):
+        seconds = float(song.split("-")[1])
+        data = synthetic_stems(seconds=seconds, n_stems=len(STEMS), seed=zlib.crc32(song.encode()))
+        return cls(song, sr, encode(data, storage))
+
+
+def _selector(blocksize=512):
+    """Two-deck SongSelector on the null backend, stepped by hand."""
+    return SongSelector(SR, backend="null", backend_options={"blocksize": blocksize, "speed": 0},
+                        track_cache=TrackCache(track_class=SyntheticTrack))
+
+
+def _settle(s):
+    """Wait for select()'s background waveform builds, so they don't run during a measurement."""
+    while not all(len(s.waveforms[side]) for side in s.decks if s.tracks[side] is not None):
+        time.sleep(0.01)
+
+
+def _submixes_ready(s, timeout=5.0):
+    """Step the stream until every deck that can read a submix (playback/submix.py) does. Returns how many do."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        s.stream.step()
+        reading = sum(s.submixes.get(d, s._tracks[d], s._mask[d]) is not None for d in s._active)
+        wanted = sum(s._mask[d] > 0 for d in s._active) if s.submixes.budget else 0
+        if reading >= wanted or time.perf_counter() > deadline:
+            return reading
+        time.sleep(0.01)
+
+
+def _median_time(fn, setup=None, repeats=3):
+    """Median seconds of single fn() calls, each after an untimed setup()."""
+    runs = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return float(np.median(runs))
+
+
+def _result(case, params, seconds, **metrics):
+    return {"case": case, "params": params, "seconds": seconds, "metrics": metrics}
+
+
+def bench_callback(quick=False):
+    blocks = [128, 512, 2048] if quick else BLOCK_SIZES
+    rates = (1.0, 1.37) if quick else RATES
+    min_time = 0.05 if quick else 0.2
+    results = []
+    print("Audio callback, 2 decks playing  (us per block, median; load = callback time / block duration;\n"
+          "  decks read stem submixes once built, as in the app)")
+    print(f"  {'block':>6}  {'rate':>5}  {'stems':>7}  {'us/block':>9}  {'ns/frame':>8}  {'load':>6}  "
+          f"{'p99 ms':>7}  {'max ms':>7}")
+    for frames in blocks:
+        s = _selector(frames)
+        try:
+            for side, song in zip(s.decks, (f"synth-{CALLBACK_SECONDS}-a", f"synth-{CALLBACK_SECONDS}-b")):
+                s.select(side, song)
+                s.play(side)
+            _settle(s)
+            wrap = s.tracks[s.decks[0]].length / 2
+            for rate in rates:
+                for name, volumes in MUTES.items():
+                    for side in s.decks:
+                        s.set_rate(side, rate)
+                        for i, vol in enumerate(volumes):
+                            (s.unmute if vol else s.mute)(side, i)
+                    s.stream.step()  # apply the commands
+                    submixes = _submixes_ready(s)
+                    s._position[:] = 0.0
+                    s.audio_stats = CallbackStats(SR)
+
+                    def block():
+                        s.stream.step()
+                        if s._position[0] > wrap:
+                            s._position[:] = 0.0
+
+                    cost = time_per_call(block, min_time)
+                    stats = s.audio_stats.snapshot()
+                    p99 = min(stats["p99_ms"], stats["max_ms"])  # a histogram bin's upper edge can pass the max
+                    load = cost * SR / frames
+                    results.append(_result("callback", {"block": frames, "rate": rate, "stems": name}, cost,
+                                           us_per_block=cost * 1e6, ns_per_frame=cost / frames * 1e9, load=load,
+                                           p99_ms=p99, max_ms=stats["max_ms"], calls=stats["calls"],
+                                           submix_decks=submixes))
+                    print(f"  {frames:6d}  {rate:5.2f}  {name:>7}  {cost * 1e6:9.1f}  {cost / frames * 1e9:8.1f}  "
+                          f"{load:6.1%}  {p99:7.3f}  {stats['max_ms']:7.3f}")
+        finally:
+            s.close()
+    return results
+
+
+def bench_select(quick=False):
+    lengths = LENGTHS[:1] if quick else LENGTHS
+    results = []
+    print("select() of a song already in the track cache  (ms, median)")
+    s = _selector()
+    try:
+        for seconds in lengths:
+            song = f"synth-{seconds}"
+            s.select("left", song)  # opens it and builds its waveform once
+            _settle(s)
+            s.select("left", "synth-1")
+
+            def swap():
+                s.select("left", song)
+                s.select("left", "synth-1")
+
+            cost = time_per_call(swap, 0.05 if quick else 0.2) / 2
+            s.select("left", "synth-1")
+            s.track_cache.clear()  # let go of it before the next, longer one
+            results.append(_result("select", {"seconds": seconds}, cost, ms=cost * 1e3))
+            print(f"  {seconds:4d} s  {cost * 1e3:8.3f}")
+    finally:
+        s.close()
+    return results
+
+
+def bench_bpm_sync(quick=False):
+    lengths = LENGTHS[:1] if quick else LENGTHS
+    repeats = 1 if quick else 3
+    results = []
+    print("apply_bpm_sync() on 2 decks at 124 / 128 BPM  (ms, median)")
+    print(f"  {'length':>6}  {'fold':>9}  {'resample':>9}")
+    s = _selector()
+    try:
+        for seconds in lengths:
+            songs = (f"synth-{seconds}-a", f"synth-{seconds}-b")
+
+            def load():
+                for side, song, bpm in zip(s.decks, songs, (124.0, 128.0)):
+                    s.select(side, song)
+                    s.bpm[side] = bpm
+                _settle(s)
+                s.stream.step()
+
+            load()
+
+            def fold():
+                s.apply_bpm_sync()
+                s.commands.drain(s._apply_command)
+
+            folded = time_per_call(fold, 0.05 if quick else 0.2)
+            resampled = _median_time(lambda: s.apply_bpm_sync(resample=True, quality="fast"), load, repeats)
+            for side in s.decks:
+                s.select(side, "synth-1")
+            s.stream.step()
+            s.track_cache.clear()
+            results.append(_result("bpm_sync", {"seconds": seconds, "mode": "fold"}, folded, ms=folded * 1e3))
+            results.append(_result("bpm_sync", {"seconds": seconds, "mode": "resample", "quality": "fast"},
+                                   resampled, ms=resampled * 1e3, x_realtime=2 * seconds / resampled))
+            print(f"  {seconds:4d} s  {folded * 1e3:9.3f}  {resampled * 1e3:9.1f}")
+    finally:
+        s.close()
+    return results
+
+
+def bench_waveform(quick=False):
+    lengths = LENGTHS[:1] if quick else LENGTHS
+    repeats = 1 if quick else 3
+    results = []
+    print("_build_waveform() from scratch  (ms, median)")
+    s = _selector()
+    try:
+        for seconds in lengths:
+            s.select("left", f"synth-{seconds}")
+            track = s.tracks["left"]
+            _settle(s)
+
+            def reset():
+                track.waveform = None
+
+            cost = _median_time(lambda: s._build_waveform("left"), reset, repeats)
+            s.select("left", "synth-1")
+            s.track_cache.clear()
+            results.append(_result("waveform", {"seconds": seconds}, cost, ms=cost * 1e3,
+                                   ms_per_minute=cost * 1e3 * 60 / seconds))
+            print(f"  {seconds:4d} s  {cost * 1e3:8.2f}")
+    finally:
+        s.close()
+    return results
+
+
+BENCHES = {"callback": bench_callback, "select": bench_select, "bpm_sync": bench_bpm_sync,
+           "waveform": bench_waveform}
+
+
+def _meta(quick):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "quick": quick,
+        "sr": SR,
+    }
+
+
+def _key(result):
+    return result["case"], tuple(sorted(result["params"].items()))
+
+
+def _label(result):
+    return result["case"] + " " + " ".join(f"{k}={v}" for k, v in result["params"].items())
+
+
+def compare(base, new, threshold=THRESHOLD):
+    """Print new/base time ratios for every result in both runs. Returns the number of regressions."""
+    old = {_key(r): r for r in base["results"]}
+    ratios = []
+    regressions = 0
+    print(f"Comparing {new['meta'].get('commit')} against {base['meta'].get('commit')}  "
+          f"(new / base time; flagged beyond {threshold:.0%})")
+    for r in new["results"]:
+        b = old.get(_key(r))
+        if b is None or not b["seconds"]:
+            continue
+        ratio = r["seconds"] / b["seconds"]
+        ratios.append(ratio)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"  {_label(r):<44}  {b['seconds'] * 1e3:10.4f} ms  {r['seconds'] * 1e3:10.4f} ms  {ratio:6.2f}x{flag}")
+    if ratios:
+        print(f"  {len(ratios)} results, geometric mean {float(np.exp(np.mean(np.log(ratios)))):.3f}x, "
+              f"{regressions} regressions")
+    else:
+        print("  no results in common")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mixing engine benchmark suite with JSON results.")
+    parser.add_argument("--case", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and shorter runs")
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="base results, or base and new results to compare without running")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown flagged as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a base file and optionally a new one")
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(base, new, args.threshold) else 0
+
+    run = {"meta": _meta(args.quick), "results": []}
+    for case in args.case:
+        run["results"] += BENCHES[case](args.quick)
+        print()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=1)
+        print(f"Wrote {len(run['results'])} results to {args.output}")
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        return 1 if compare(base, run, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Manage the decoded-PCM stem cache (see playback/cache.py).
+
+Usage (from the repo root):
+  python -m tools.cache warm [song ...]    Decode songs (default: all of songs/) into the cache.
+  python -m tools.cache clear [song ...]   Drop cached entries (default: all).
+  python -m tools.cache prune              Drop entries whose source file changed or vanished.
+  python -m tools.cache stats              Show entry count and disk usage.
+"""
+import sys
+import time
+import argparse
+from playback import cache
+from playback.library import list_songs
+from playback.track import Track, STEMS, stem_path
+
+
+def warm(songs, sr):
+    total = time.perf_counter()
+    warmed = cached = 0
+    for song in songs:
+        start = time.perf_counter()
+        if cache.load([stem_path(song, stem) for stem in STEMS], sr) is not None:
+            cached += 1
+            continue
+        try:
+            track = Track.open(song, sr)
+        except (OSError, RuntimeError) as e:
+            print(f"  {song}: skipped ({e})")
+            continue
+        track.wait()
+        if not track.done or cache.load(track.paths, sr) is None:
+            print(f"  {song}: failed (a stem didn't decode to the end)")
+            continue
+        warmed += 1
+        print(f"  {song}: {track.length / sr:6.1f} s of audio in {time.perf_counter() - start:5.2f} s")
+    print(f"Warmed {warmed} of {len(songs)} songs in {time.perf_counter() - total:.1f} s"
+          + (f" ({cached} already cached)" if cached else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the decoded-PCM stem cache.")
+    parser.add_argument("command", choices=["warm", "clear", "prune", "stats"])
+    parser.add_argument("songs", nargs="*", help="song folder names under songs/ (default: all)")
+    parser.add_argument("--sr", type=int, default=44100, help="engine sample rate to cache at")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        warm(args.songs or list_songs(), args.sr)
+    elif args.command == "clear":
+        n = cache.invalidate(songs=args.songs or None)
+        print(f"Removed {n} cache entries.")
+    elif args.command == "prune":
+        n = cache.invalidate(stale_only=True)
+        print(f"Removed {n} stale cache entries.")
+    else:
+        count, size = cache.usage()
+        print(f"{count} entries, {size / 1e6:.1f} MB in {cache.CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Render a DJ set to an audio file offline, without a sound card.
+
+Usage (from the repo root):
+  python -m tools.render set.json out.wav [--blocksize 8192]
+
+set.json describes the decks and a timeline of actions (times in seconds):
+  {
+    "decks": {"left": "song_a", "right": "song_b"},
+    "sync": true,                  (or a list of decks to sync)
+    "duration": 90,
+    "events": [
+      [0, "play", "left"],
+      [16, "play", "right"],
+      [16, "mute", "left", 3],
+      [32, "set_rate", "right", 1.05],
+      [48, "memory_cue", "left"],
+      [64, "seek", "left", -8],
+      [80, "pause", "left"]
+    ]
+  }
+Any number of decks can be named (e.g. four for a 4-deck set).
+Actions: play, pause, set_rate, mute, unmute, seek, memory_cue, reset_cue, cue, deck_volume,
+loop, loop_roll (beats), exit_loop, highpass, lowpass (Hz), and without a deck
+crossfader (0..1) and crossfader_curve (cut, linear, constant_power).
+"""
+import sys
+import json
+import argparse
+from playback.selector import SongSelector
+from playback.render import render
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a DJ set timeline to a WAV/FLAC file.")
+    parser.add_argument("timeline", help="JSON set description")
+    parser.add_argument("output", help="output file (.wav or .flac)")
+    parser.add_argument("--blocksize", type=int, default=8192)
+    parser.add_argument("--storage", default="float32", choices=["float32", "float16", "int16"])
+    args = parser.parse_args(argv)
+
+    with open(args.timeline) as f:
+        spec = json.load(f)
+
+    selector = SongSelector(storage=args.storage, stream=False, decks=tuple(spec["decks"]))
+    try:
+        for side, song in spec["decks"].items():
+            selector.select(side, song)
+        sync = spec.get("sync", True)
+        if sync:
+            selector.apply_bpm_sync(sides=sync if isinstance(sync, list) else None)
+        stats = render(selector, spec["events"], args.output, spec["duration"], blocksize=args.blocksize)
+    finally:
+        selector.close()
+
+    print(f"Rendered {stats['seconds']:.1f} s to {args.output} in {stats['wall']:.2f} s "
+          f"({stats['realtime_factor']:.1f}x realtime)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())